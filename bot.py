@@ -1,914 +1,1081 @@
-import logging
-import uuid
-from datetime import datetime
-from typing import Optional, Dict, Any, Deque, Tuple, Set, TypedDict, cast
-import io
-from collections import deque
-from telegram import Update, InlineKeyboardMarkup, Message, CallbackQuery
-from telegram.ext import Application, CommandHandler, MessageHandler, CallbackQueryHandler, filters, ContextTypes
-from security import SecurityManager, require_auth
-from sd_controller import StableDiffusionController
-from config import Config, UserSettings
-from keyboards import Keyboards, CallbackData
-from user_manager import UserManager
-from form_manager import FormManager
-from utils import safe_call
-from text_content import TextContent
-import asyncio
-import json
-import os
-
-
-logging.basicConfig(
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-    level=logging.INFO
-)
-logging.getLogger("httpx").setLevel(logging.WARNING)
-logger = logging.getLogger(__name__)
-
-def _str_or_empty(v: Any) -> str:
-    return v if isinstance(v, str) else ""
-
-class SnapshotParams(TypedDict, total=False):
-    negative_prompt: str
-    seed: int
-    width: int
-    height: int
-    steps: int
-    cfg_scale: float
-    sampler_name: str
-
-class TaskSnapshot(TypedDict):
-    prompt: str
-    params: SnapshotParams
-
-class TelegramBot:
-    application: Optional[Application]  # type: ignore[type-arg]
-    last_prompt: Optional[str]
-    user_last_photo_msg: Dict[str, int]
-    security: SecurityManager
-    sd_controller: StableDiffusionController
-    user_manager: UserManager
-    form_manager: FormManager
-
-    def __init__(self) -> None:
-        self.security = SecurityManager()
-        self.sd_controller = StableDiffusionController()
-        self.user_manager = UserManager(Config.SD_DEFAULT_PARAMS)
-        self.form_manager = FormManager()
-        self.application = None
-        self.last_prompt = None
-        self.user_last_photo_msg = {}
-        # 记录任务ID与对应结果，供点赞保存使用，避免并发串任务
-        self.task_results: Dict[str, Dict[str, Any]] = {}
-        # 记录任务ID与生成参数（用于高清化复用原图参数）
-        self.task_params: Dict[str, Dict[str, Any]] = {}
-        # 每个任务的完整快照，便于复用与溯源
-        self.task_snapshots: Dict[str, TaskSnapshot] = {}
-        # 每个用户最近包含点赞按钮的图片消息 (最多10条)
-        self.user_recent_photo_msgs: Dict[str, Deque[Tuple[int, int]]] = {}
-
-        # 在启动时加载快照缓存
-        self._snapshot_cache_file = os.path.join(Config.DATA_DIR, 'snapshots.json')
-        try:
-            if os.path.exists(self._snapshot_cache_file):
-                with open(self._snapshot_cache_file, 'r', encoding='utf-8') as f:
-                    raw = cast(Dict[str, Any], json.load(f))
-                    # 运行时校验结构
-                    snapshots: Dict[str, TaskSnapshot] = {}
-                    items: list[tuple[str, Any]] = list(raw.items())[-Config.SNAPSHOT_CACHE_LIMIT:]
-                    for k, v in items:
-                        if isinstance(v, dict) and 'prompt' in v and 'params' in v and isinstance(v['params'], dict):
-                            snapshots[str(k)] = cast(TaskSnapshot, v)
-                    self.task_snapshots = snapshots
-        except Exception:
-            pass
-        self.waiting_for_negative_prompt: Set[str] = set()
-
-    # 下面的代码只做流程分发，具体逻辑交给 manager/controller
-    def create_main_menu(self) -> InlineKeyboardMarkup:
-        return Keyboards.main_menu()
-
-    def create_generation_menu(self) -> InlineKeyboardMarkup:
-        return Keyboards.generation_menu()
-
-    def create_resolution_menu(self, user_id: str) -> InlineKeyboardMarkup:
-        current_settings: UserSettings = self.user_manager.get_settings(user_id)
-        current_res = f"{current_settings['width']}x{current_settings['height']}"
-        return Keyboards.resolution_menu(current_res)
-
-    def get_user_settings(self, user_id: str) -> UserSettings:
-        return self.user_manager.get_settings(user_id)
-
-    async def start(self, update: Update, _: ContextTypes.DEFAULT_TYPE) -> None:
-        """开始命令处理"""
-        if update.effective_user is None or update.message is None:
-            return
-        user = update.effective_user
-        user_id: str = str(user.id)
-        if not self.security.is_authorized_user(user_id):
-            await update.message.reply_text(
-                TextContent.USER_UNAUTHORIZED.format(username=user.username, userid=user.id)
-            )
-            return
-        sd_status = await self.sd_controller.check_api_status()
-        status_text = TextContent.STATUS_ONLINE if sd_status else TextContent.STATUS_OFFLINE
-        welcome_text = TextContent.WELCOME.format(username=user.first_name, status=status_text)
-        await update.message.reply_text(
-            welcome_text,
-            reply_markup=Keyboards.main_menu()
-        )
-
-    @require_auth
-    async def handle_callback(self, update: Update, _: ContextTypes.DEFAULT_TYPE) -> None:
-        """处理回调按钮"""
-        query = update.callback_query
-        if query is None:
-            return
-        user_id: str = str(query.from_user.id)
-        await query.answer()
-        
-        data_opt = query.data
-        if data_opt is None:
-            return
-        data: str = data_opt
-
-        if data.startswith(CallbackData.LIKE.value.split("{")[0]):
-            # like_{task_id}
-            task_id = data.split("_", 1)[1]
-            result = self.task_results.get(task_id)
-            if result:
-                await self.sd_controller.save_result_locally(result)
-            self.security.complete_task(task_id, "liked")
-            if query.message is not None:
-                base = _str_or_empty(query.message.caption) or _str_or_empty(query.message.text)
-                new_text = f"{base}{TextContent.LIKED_CAPTION_APPEND}"
-                has_media = bool(getattr(query.message, "photo", None) or
-                                getattr(query.message, "video", None) or
-                                getattr(query.message, "document", None))
-
-                try:
-                    if has_media or isinstance(query.message.caption, str):
-                        await query.edit_message_caption(new_text, reply_markup=None)
-                    else:
-                        await query.edit_message_text(new_text, reply_markup=None)
-                except Exception:
-                    pass
-        elif data.startswith(CallbackData.ENHANCE_HR.value.split("{")[0]):
-            # enhance_hr_{task_id}
-            task_id = data.split("_", 2)[2]
-            await self.enhance_image_hr(query, user_id, task_id)
-        elif data == CallbackData.MAIN_MENU.value:
-            # main_menu
-            sd_status = await self.sd_controller.check_api_status()
-            status_text = TextContent.STATUS_ONLINE if sd_status else TextContent.STATUS_OFFLINE
-            await query.edit_message_text(
-                TextContent.WELCOME.format(username=query.from_user.first_name, status=status_text),
-                reply_markup=Keyboards.main_menu()
-            )
-        elif data == CallbackData.TXT2IMG.value:
-            # txt2img
-            await query.edit_message_text(
-                TextContent.GENERATION_MENU,
-                reply_markup=Keyboards.generation_menu()
-            )
-        elif data == CallbackData.INPUT_PROMPT.value:
-            # input_prompt
-            user_settings: UserSettings = self.get_user_settings(user_id)
-            await query.edit_message_text(
-                TextContent.INPUT_PROMPT.format(
-                    resolution=f"{user_settings['width']}x{user_settings['height']}"
-                )
-            )
-        elif data == CallbackData.RANDOM_GENERATE.value:
-            # random_generate
-            await self.random_generate(query)
-        elif data == CallbackData.ADVANCED_FORM.value:
-            # advanced_form - 新增表单功能
-            await self.show_advanced_form(query, user_id)
-        elif data == CallbackData.SD_STATUS.value:
-            # sd_status
-            await self.show_sd_status(query)
-        elif data == CallbackData.SD_SETTINGS.value:
-            # sd_settings
-            await self.show_sd_settings(query)
-        elif data == CallbackData.GENERATION_HISTORY.value:
-            # generation_history
-            await self.show_generation_history(query)
-        elif data == CallbackData.RESOLUTION_SETTINGS.value:
-            # resolution_settings
-            await self.show_resolution_settings(query, user_id)
-        elif data.startswith(CallbackData.SET_RESOLUTION.value.split("{")[0]):  # "set_resolution_"
-            # set_resolution_{res}
-            await self.set_resolution(query, data, user_id)
-        elif data.startswith(CallbackData.INTERRUPT.value.split("{")[0]):  # "interrupt_"
-            # interrupt_{task_id}
-            task_id = data.split("_", 1)[1]
-            await self.interrupt_generation(query, task_id)
-        elif data == CallbackData.NEGATIVE_PROMPT_SETTINGS.value:
-            # negative_prompt_settings
-            await self.show_negative_prompt_settings(query, user_id)
-        elif data == CallbackData.SET_NEGATIVE_PROMPT.value:
-            # set_negative_prompt
-            await self.request_negative_prompt_input(query, user_id)
-        elif data == CallbackData.RESET_NEGATIVE_PROMPT.value:
-            # reset_negative_prompt
-            await self.reset_negative_prompt(query, user_id)
-        elif data == CallbackData.CANCEL_NEGATIVE_PROMPT.value:
-            # cancel_negative_prompt
-            await self.cancel_negative_prompt_input(query, user_id)
-        # 新增表单相关回调处理
-        elif data == CallbackData.FORM_SET_PROMPT.value:
-            # form_set_prompt
-            await self.request_form_prompt_input(query, user_id)
-        elif data == CallbackData.FORM_SET_RESOLUTION_MENU.value:
-            # form_set_resolution_menu
-            await self.show_form_resolution_menu(query, user_id)
-        elif data.startswith(CallbackData.FORM_SET_RESOLUTION.value.split("{")[0]):
-            # form_set_resolution_{res}
-            await self.set_form_resolution(query, data, user_id)
-        elif data == CallbackData.FORM_SET_SEED.value:
-            # form_set_seed
-            await self.request_form_seed_input(query, user_id)
-        elif data == CallbackData.FORM_TOGGLE_HIRES.value:
-            # form_toggle_hires
-            await self.toggle_form_hires(query, user_id)
-        elif data == CallbackData.FORM_GENERATE.value:
-            # form_generate
-            await self.generate_from_form(query, user_id)
-        elif data == CallbackData.FORM_RESET.value:
-            # form_reset
-            await self.reset_form(query, user_id)
-        elif data == CallbackData.FORM_CANCEL_INPUT.value:
-            # form_cancel_input
-            await self.cancel_form_input(query, user_id)
-
-    # 原有方法保持不变
-    async def show_resolution_settings(self, query: CallbackQuery, user_id: str) -> None:
-        """显示分辨率设置菜单"""
-        user_settings: UserSettings = self.get_user_settings(user_id)
-        current_res = f"{user_settings['width']}x{user_settings['height']}"
-        text = TextContent.RESOLUTION_SETTINGS.format(resolution=current_res)
-        await query.edit_message_text(
-            text,
-            reply_markup=Keyboards.resolution_menu(current_res)
-        )
-
-    async def set_resolution(self, query: CallbackQuery, callback_data: str, user_id: str) -> None:
-        """设置用户分辨率"""
-        parts = callback_data.split("_")
-        width = int(parts[2])
-        height = int(parts[3])
-        user_settings: UserSettings = self.get_user_settings(user_id)
-        user_settings['width'] = width
-        user_settings['height'] = height
-        await query.edit_message_text(
-            TextContent.RESOLUTION_SET.format(width=width, height=height),
-            reply_markup=Keyboards.resolution_menu(f"{width}x{height}")
-        )
-
-    async def random_generate(self, query: CallbackQuery) -> None:
-        """随机生成图片"""
-        import random
-        prompt: str = random.choice(TextContent.RANDOM_PROMPTS)
-        await query.edit_message_text(TextContent.RANDOM_GENERATE.format(prompt=prompt))
-        user_id: str = str(query.from_user.id)
-        username: str = query.from_user.username or query.from_user.first_name
-        await self.generate_image_task(user_id, username, prompt, query.message)
-
-    async def show_sd_status(self, query: CallbackQuery) -> None:
-        """显示SD WebUI状态"""
-        api_status: bool = await self.sd_controller.check_api_status()
-        
-        if api_status:
-            models = await self.sd_controller.get_models()
-            samplers = await self.sd_controller.get_samplers()
-            progress, eta = await self.sd_controller.get_progress()
-            current_model = await self.sd_controller.get_current_model()
-            eta_text = TextContent.ETA_TEXT.format(eta=eta) if eta > 0 else ""
-            status_text = TextContent.SD_STATUS_ONLINE.format(
-                current_model=current_model,
-                model_count=len(models),
-                sampler_count=len(samplers),
-                progress=progress*100,
-                eta_text=eta_text
-            )
-        else:
-            status_text = TextContent.SD_STATUS_OFFLINE.format(api_url=Config.SD_API_URL)
-        
-        keyboard = Keyboards.main_menu()
-        await query.edit_message_text(
-            status_text,
-            reply_markup=keyboard
-        )
-    
-    async def show_sd_settings(self, query: CallbackQuery) -> None:
-        """显示SD设置信息"""
-        user_id: str = str(query.from_user.id)
-        user_settings: UserSettings = self.get_user_settings(user_id)
-        
-        settings_text = TextContent.SD_SETTINGS.format(
-            width=user_settings['width'],
-            height=user_settings['height'],
-            steps=user_settings['steps'],
-            cfg_scale=user_settings['cfg_scale'],
-            sampler_name=user_settings['sampler_name'],
-            negative_prompt=user_settings['negative_prompt'][:100] + "..."
-        )
-        
-        keyboard = Keyboards.sd_setting_menu()
-        await query.edit_message_text(
-            settings_text,
-            reply_markup=keyboard
-        )
-    
-    async def show_generation_history(self, query: CallbackQuery) -> None:
-        """显示生成历史"""
-        history = self.security.generation_history[-5:]  # 最近5条
-        if history:
-            text = TextContent.GENERATION_HISTORY_HEADER
-            for entry in reversed(history):
-                timestamp = datetime.fromtimestamp(entry['timestamp']).strftime("%H:%M:%S")
-                status = "✅" if entry['success'] else "❌"
-                text += f"{status} {timestamp} - {entry['username']}\n"
-                text += f"💭 {entry['prompt']}\n"
-                if not entry['success'] and entry.get('error'):
-                    text += f"⚠️ {entry['error']}\n"
-                text += "\n"
-        else:
-            text = TextContent.GENERATION_HISTORY_EMPTY
-        
-        keyboard = Keyboards.main_menu()
-        await query.edit_message_text(
-            text,
-            reply_markup=keyboard
-        )
-    
-    async def show_negative_prompt_settings(self, query: CallbackQuery, user_id: str) -> None:
-        """显示负面词设置菜单"""
-        user_settings: UserSettings = self.get_user_settings(user_id)
-        current_negative_prompt = user_settings['negative_prompt']
-        
-        # 截断显示长负面词
-        display_negative_prompt = current_negative_prompt
-        if len(display_negative_prompt) > 200:
-            display_negative_prompt = display_negative_prompt[:200] + "..."
-        
-        text = TextContent.NEGATIVE_PROMPT_SETTINGS.format(
-            negative_prompt=display_negative_prompt
-        )
-        await query.edit_message_text(
-            text,
-            reply_markup=Keyboards.negative_prompt_menu()
-        )
-
-    async def request_negative_prompt_input(self, query: CallbackQuery, user_id: str) -> None:
-        """请求用户输入自定义负面词"""
-        self.waiting_for_negative_prompt.add(user_id)
-        await query.edit_message_text(
-            TextContent.INPUT_NEGATIVE_PROMPT,
-            reply_markup=Keyboards.negative_prompt_input_menu()
-        )
-
-    async def reset_negative_prompt(self, query: CallbackQuery, user_id: str) -> None:
-        """重置用户负面词为默认值"""
-        self.user_manager.reset_negative_prompt(user_id)
-        default_negative_prompt = Config.SD_DEFAULT_PARAMS['negative_prompt']
-        
-        # 截断显示
-        display_negative_prompt = default_negative_prompt
-        if len(display_negative_prompt) > 200:
-            display_negative_prompt = display_negative_prompt[:200] + "..."
-            
-        await query.edit_message_text(
-            TextContent.NEGATIVE_PROMPT_RESET.format(
-                negative_prompt=display_negative_prompt
-            ),
-            reply_markup=Keyboards.negative_prompt_menu()
-        )
-
-    async def handle_negative_prompt_input(self, update: Update, user_id: str, negative_prompt: str) -> None:
-        """处理用户输入的负面词"""
-        self.waiting_for_negative_prompt.discard(user_id)  # 移除等待状态
-        
-        # 验证负面词长度
-        if len(negative_prompt) > 1000:
-            if update.message is not None:
-                await update.message.reply_text(TextContent.NEGATIVE_PROMPT_TOO_LONG)
-            return
-        
-        # 保存负面词
-        self.user_manager.set_negative_prompt(user_id, negative_prompt)
-        
-        # 截断显示
-        display_negative_prompt = negative_prompt
-        if len(display_negative_prompt) > 200:
-            display_negative_prompt = display_negative_prompt[:200] + "..."
-        
-        if update.message is not None:
-            await update.message.reply_text(
-                TextContent.NEGATIVE_PROMPT_SET.format(negative_prompt=display_negative_prompt),
-                reply_markup=Keyboards.negative_prompt_menu()
-            )
-
-    async def cancel_negative_prompt_input(self, query: CallbackQuery, user_id: str) -> None:
-        """取消负面词输入"""
-        self.waiting_for_negative_prompt.discard(user_id)  # 移除等待状态
-        
-        # 获取当前负面词设置并显示设置页面
-        user_settings: UserSettings = self.get_user_settings(user_id)
-        current_negative_prompt = user_settings['negative_prompt']
-        
-        # 截断显示长负面词
-        display_negative_prompt = current_negative_prompt
-        if len(display_negative_prompt) > 200:
-            display_negative_prompt = display_negative_prompt[:200] + "..."
-        
-        cancel_text = TextContent.NEGATIVE_PROMPT_INPUT_CANCELLED + "\n\n" + TextContent.NEGATIVE_PROMPT_SETTINGS.format(
-            negative_prompt=display_negative_prompt
-        )
-        
-        await query.edit_message_text(
-            cancel_text,
-            reply_markup=Keyboards.negative_prompt_menu()
-        )
-
-    # 新增表单相关方法
-    async def show_advanced_form(self, query: CallbackQuery, user_id: str) -> None:
-        """显示高级表单"""
-        form_data = self.form_manager.get_user_form(user_id)
-        summary = self.form_manager.format_form_summary(user_id)
-        
-        text = TextContent.ADVANCED_FORM_TITLE + "\n\n" + TextContent.FORM_SUMMARY.format(**summary)
-        await query.edit_message_text(
-            text,
-            reply_markup=Keyboards.advanced_form_menu(cast(Dict[str, object], form_data))
-        )
-
-    async def request_form_prompt_input(self, query: CallbackQuery, user_id: str) -> None:
-        """请求表单正面词输入"""
-        self.form_manager.set_input_state(user_id, "prompt")
-        await query.edit_message_text(
-            TextContent.FORM_INPUT_PROMPT,
-            reply_markup=Keyboards.form_input_cancel_menu()
-        )
-
-    async def show_form_resolution_menu(self, query: CallbackQuery, user_id: str) -> None:
-        """显示表单分辨率选择菜单"""
-        form_data = self.form_manager.get_user_form(user_id)
-        current_res_val: str = (form_data.get('resolution') or "")
-        
-        text = TextContent.FORM_RESOLUTION_MENU.format(current_resolution=current_res_val or "未设置")
-        await query.edit_message_text(
-            text,
-            reply_markup=Keyboards.form_resolution_menu(current_res_val)
-        )
-
-    async def set_form_resolution(self, query: CallbackQuery, callback_data: str, user_id: str) -> None:
-        """设置表单分辨率"""
-        # 解析 form_set_resolution_1024_1024 格式
-        parts = callback_data.split("_")
-        width = int(parts[3])
-        height = int(parts[4])
-        resolution = f"{width}x{height}"
-        
-        self.form_manager.update_form_field(user_id, 'resolution', resolution)
-        
-        await query.edit_message_text(
-            TextContent.FORM_RESOLUTION_SET.format(resolution=resolution),
-            reply_markup=Keyboards.form_resolution_menu(resolution)
-        )
-
-    async def request_form_seed_input(self, query: CallbackQuery, user_id: str) -> None:
-        """请求表单种子输入"""
-        self.form_manager.set_input_state(user_id, "seed")
-        await query.edit_message_text(
-            TextContent.FORM_INPUT_SEED,
-            reply_markup=Keyboards.form_input_cancel_menu()
-        )
-
-    async def toggle_form_hires(self, query: CallbackQuery, user_id: str) -> None:
-        """切换表单高清修复选项"""
-        form_data = self.form_manager.get_user_form(user_id)
-        current_hires = form_data.get('hires_fix', False)
-        new_hires = not current_hires
-        
-        self.form_manager.update_form_field(user_id, 'hires_fix', new_hires)
-        
-        message = TextContent.FORM_HIRES_ENABLED if new_hires else TextContent.FORM_HIRES_DISABLED
-        
-        # 更新表单显示
-        summary = self.form_manager.format_form_summary(user_id)
-        text = message + "\n\n" + TextContent.FORM_SUMMARY.format(**summary)
-        
-        await query.edit_message_text(
-            text,
-            reply_markup=Keyboards.advanced_form_menu(cast(Dict[str, object], form_data))
-        )
-
-    async def generate_from_form(self, query: CallbackQuery, user_id: str) -> None:
-        """从表单生成图片"""
-        username = query.from_user.username or query.from_user.first_name
-        
-        # 获取提示词
-        prompt = self.form_manager.get_prompt_from_form(user_id, TextContent.RANDOM_PROMPTS)
-        
-        await query.edit_message_text(
-            f"🚀 正在使用表单设置生成图片...\n💭 {prompt[:50]}{'...' if len(prompt) > 50 else ''}"
-        )
-        
-        # 生成图片，传递表单数据标识
-        await self.generate_image_task(user_id, username, prompt, query.message, from_form=True)
-
-    async def reset_form(self, query: CallbackQuery, user_id: str) -> None:
-        """重置表单"""
-        self.form_manager.reset_user_form(user_id)
-        
-        form_data = self.form_manager.get_user_form(user_id)
-        summary = self.form_manager.format_form_summary(user_id)
-        
-        text = TextContent.FORM_RESET_SUCCESS + "\n\n" + TextContent.FORM_SUMMARY.format(**summary)
-        await query.edit_message_text(
-            text,
-            reply_markup=Keyboards.advanced_form_menu(cast(Dict[str, object], form_data))
-        )
-
-    async def cancel_form_input(self, query: CallbackQuery, user_id: str) -> None:
-        """取消表单输入"""
-        self.form_manager.clear_input_state(user_id)
-        
-        # 返回表单页面
-        form_data = self.form_manager.get_user_form(user_id)
-        summary = self.form_manager.format_form_summary(user_id)
-        
-        text = TextContent.FORM_INPUT_CANCELLED + "\n\n" + TextContent.FORM_SUMMARY.format(**summary)
-        await query.edit_message_text(
-            text,
-            reply_markup=Keyboards.advanced_form_menu(cast(Dict[str, object], form_data))
-        )
-
-    async def handle_form_input(self, update: Update, user_id: str, input_text: str) -> None:
-        """处理表单输入"""
-        input_state = self.form_manager.get_input_state(user_id)
-        
-        if input_state == "prompt":
-            await self.handle_form_prompt_input(update, user_id, input_text)
-        elif input_state == "seed":
-            await self.handle_form_seed_input(update, user_id, input_text)
-
-    async def handle_form_prompt_input(self, update: Update, user_id: str, prompt: str) -> None:
-        """处理表单正面词输入"""
-        self.form_manager.clear_input_state(user_id)
-        
-        if prompt.lower().strip() == 'skip':
-            self.form_manager.update_form_field(user_id, 'prompt', None)
-            message = TextContent.FORM_PROMPT_SKIPPED
-        else:
-            self.form_manager.update_form_field(user_id, 'prompt', prompt)
-            display_prompt = prompt[:50] + '...' if len(prompt) > 50 else prompt
-            message = TextContent.FORM_PROMPT_SET.format(prompt=display_prompt)
-        
-        # 返回表单页面
-        form_data = self.form_manager.get_user_form(user_id)
-        summary = self.form_manager.format_form_summary(user_id)
-        text = message + "\n\n" + TextContent.FORM_SUMMARY.format(**summary)
-        
-        if update.message is None:
-            return
-        assert update.message is not None
-        await update.message.reply_text(
-            text,
-            reply_markup=Keyboards.advanced_form_menu(cast(Dict[str, object], form_data))
-        )
-
-    async def handle_form_seed_input(self, update: Update, user_id: str, seed_text: str) -> None:
-        """处理表单种子输入"""
-        self.form_manager.clear_input_state(user_id)
-        
-        is_valid, seed_value, status = self.form_manager.validate_seed(seed_text)
-        
-        if not is_valid:
-            if update.message is not None:
-                await update.message.reply_text(TextContent.FORM_SEED_INVALID)
-            return
-        
-        self.form_manager.update_form_field(user_id, 'seed', seed_value)
-        
-        if status == "已跳过":
-            message = TextContent.FORM_SEED_SKIPPED
-        elif status == "随机":
-            message = TextContent.FORM_SEED_RANDOM
-        else:
-            message = TextContent.FORM_SEED_SET.format(seed=seed_value)
-        
-        # 返回表单页面
-        form_data = self.form_manager.get_user_form(user_id)
-        summary = self.form_manager.format_form_summary(user_id)
-        text = message + "\n\n" + TextContent.FORM_SUMMARY.format(**summary)
-        
-        if update.message is None:
-            return
-        await update.message.reply_text(
-            text,
-            reply_markup=Keyboards.advanced_form_menu(cast(Dict[str, object], form_data))
-        )
-
-    @safe_call
-    @require_auth
-    async def handle_text_prompt(self, update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
-        """处理文本提示词"""
-        
-        if update.message is None or update.effective_user is None:
-            return
-        text_val = update.message.text
-        if text_val is None:
-            return
-        prompt: str = text_val.strip()
-        user_id: str = str(update.effective_user.id)
-        username: str = update.effective_user.username or update.effective_user.first_name
-        
-        # 检查是否在等待表单输入
-        if self.form_manager.is_waiting_for_input(user_id):
-            await self.handle_form_input(update, user_id, prompt)
-            return
-        
-        if user_id in self.waiting_for_negative_prompt:
-            await self.handle_negative_prompt_input(update, user_id, prompt)
-            return
-
-        # 不再清理上一条消息的按钮，改为保留最近10条的点赞按钮，超出时再移除旧的
-
-        if prompt.startswith('/'):
-            return  # 忽略命令
-
-        # 仅输入数字：重复执行“重新生成上一个提示词”的功能，次数限制在配置上限
-        if prompt.isdigit():
-            n = int(prompt)
-            n = max(1, min(n, Config.REGENERATE_MAX_RUNS))
-            if self.last_prompt is None:
-                await update.message.reply_text(TextContent.NO_LAST_PROMPT)
-                return
-            for _ in range(n):
-                # 队列限制检查
-                if self.security.get_queue_size() >= Config.MAX_QUEUE_SIZE:
-                    await update.message.reply_text(TextContent.QUEUE_FULL)
-                    break
-                # 频控
-                limit, limit_msg = self.security.check_generation_limit(user_id)
-                if not limit:
-                    await update.message.reply_text(limit_msg + "\n\n")
-                    break
-                await self.generate_image_task(user_id, username, self.last_prompt, update.message)
-            return
-        
-        # 安全检查
-        safe, safety_msg = self.security.is_safe_prompt(prompt)
-        if not safe:
-            await update.message.reply_text(TextContent.PROMPT_UNSAFE.format(msg=safety_msg))
-            return
-        
-        limit, limit_msg = self.security.check_generation_limit(user_id)
-        if not limit:
-            await update.message.reply_text(limit_msg + "\n\n")
-            return
-        
-        # 队列限制检查
-        if self.security.get_queue_size() >= Config.MAX_QUEUE_SIZE:
-            await update.message.reply_text(TextContent.QUEUE_FULL)
-            return
-
-        # 开始生成
-        await self.generate_image_task(user_id, username, prompt, update.message)
-    
-    @safe_call
-    async def generate_image_task(self, user_id: str, username: str, prompt: str, message: Message, from_form: bool = False, override_params: Optional[Dict[str, Any]] = None) -> None:
-        """生成图片任务"""
-        task_id = str(uuid.uuid4())[:8]
-        self.last_prompt = prompt  # 保存最后的提示词
-        
-        # 获取用户自定义设置
-        user_settings: UserSettings = self.get_user_settings(user_id)
-        
-        # 生成参数来源优先级：override_params > 表单参数 > 用户设置
-        generation_params: Dict[str, Any]
-        if override_params is not None:
-            generation_params = dict(user_settings)
-            generation_params.update(override_params)
-        elif from_form:
-            generation_params = self.form_manager.generate_params_from_form(user_id, user_settings)
-        else:
-            generation_params = dict(user_settings)
-        
-        # 自动生成随机seed（除非用户已指定）
-        if 'seed' not in generation_params or generation_params['seed'] is None:
-            import random
-            generation_params['seed'] = random.randint(1, 2147483647)  # 32位有符号整数范围
-        
-        # 添加到安全管理器
-        self.security.add_task(task_id, user_id, prompt)
-        self.security.add_generation_record(user_id)
-        
-        # 创建中断按钮
-        keyboard = Keyboards.interrupt_keyboard(task_id)
-        reply_markup = keyboard
-        
-        # 显示生成进度
-        progress_msg = await message.reply_text(
-            TextContent.GENERATE_PROGRESS.format(
-                task_id=task_id,
-                prompt=prompt[:50] + ('...' if len(prompt) > 50 else ''),
-                resolution=f"{generation_params['width']}x{generation_params['height']}"
-            ),
-            reply_markup=reply_markup
-        )
-        
-        # 调用SD API生成图片，使用生成参数
-        # 将 negative_prompt 单独取出以满足类型检查
-        neg_prompt_any = generation_params.get('negative_prompt')
-        neg_prompt: Optional[str] = neg_prompt_any if isinstance(neg_prompt_any, str) else None
-        rest_params = dict(generation_params)
-        if 'negative_prompt' in rest_params:
-            rest_params.pop('negative_prompt')
-        success, result = await self.sd_controller.generate_image(
-            prompt,
-            neg_prompt,
-            **rest_params
-        )
-        
-        if success:
-            reply_markup = Keyboards.like_keyboard(task_id)
-            await progress_msg.edit_text(TextContent.GENERATE_SUCCESS)
-            
-            # 构建标题，如果是表单生成则显示更多信息
-            if from_form:
-                form_data = self.form_manager.get_user_form(user_id)
-                seed_info = f"🎲 种子: {generation_params['seed']}"
-                hires_info = f"🔍 高清修复: {'开启' if bool(form_data.get('hires_fix')) else '关闭'}"
-                caption = TextContent.GENERATE_CAPTION.format(
-                    prompt=prompt,
-                    resolution=f"{generation_params['width']}x{generation_params['height']}"
-                ) + f"\n{seed_info}\n{hires_info}"
-            else:
-                caption = TextContent.GENERATE_CAPTION.format(
-                    prompt=prompt,
-                    resolution=f"{generation_params['width']}x{generation_params['height']}"
-                )
-            
-            image_bytes, api_result = cast(Tuple[io.BytesIO, Dict[str, Any]], result)
-            # 记录任务结果
-            self.task_results[task_id] = api_result
-            self.task_params[task_id] = generation_params
-            # 判断是否本次已启用高清修复
-            is_hr_enabled = bool(generation_params.get('enable_hr'))
-            reply_markup = Keyboards.like_keyboard(task_id, show_enhance=not is_hr_enabled)
-            sent_msg = await message.reply_photo(
-                photo=image_bytes,
-            caption=caption,
-                reply_markup=reply_markup
-            )
-            
-            self.user_last_photo_msg[user_id] = sent_msg.message_id
-
-            # 快照：仅保存对 SD 生成有用的参数（可复用）
-            base_keys = ['negative_prompt', 'seed', 'width', 'height', 'steps', 'cfg_scale', 'sampler_name']
-            params_snapshot = {k: generation_params[k] for k in base_keys if k in generation_params}
-            params_snapshot_t: SnapshotParams = cast(SnapshotParams, params_snapshot)
-            self.task_snapshots[task_id] = {
-                'prompt': prompt,
-                'params': params_snapshot_t,
-            }
-
-            # 写入磁盘缓存（仅保存最近 SNAPSHOT_CACHE_LIMIT 条）
-            try:
-                os.makedirs(Config.DATA_DIR, exist_ok=True)
-                # 裁剪
-                if len(self.task_snapshots) > Config.SNAPSHOT_CACHE_LIMIT:
-                    # 保留最新的 N 条
-                    latest_items = list(self.task_snapshots.items())[-Config.SNAPSHOT_CACHE_LIMIT:]
-                    self.task_snapshots = {k: v for k, v in latest_items}
-                with open(self._snapshot_cache_file, 'w', encoding='utf-8') as f:
-                    json.dump(cast(Dict[str, Any], self.task_snapshots), f, ensure_ascii=False, indent=2)
-            except Exception:
-                pass
-
-            # 维护最近10条带点赞按钮的图片消息
-            chat_id = message.chat_id
-            dq = self.user_recent_photo_msgs.setdefault(user_id, deque())
-            dq.append((chat_id, sent_msg.message_id))
-            if len(dq) > Config.LIKABLE_MESSAGE_LIMIT and self.application is not None:  # type: ignore[reportUnknownMemberType]
-                old_chat_id, old_msg_id = dq.popleft()
-                try:
-                    if self.application.bot is not None:  # type: ignore[attr-defined]
-                        await self.application.bot.edit_message_reply_markup(  # type: ignore[attr-defined]
-                            chat_id=old_chat_id,
-                            message_id=old_msg_id,
-                            reply_markup=None
-                        )
-                except Exception:
-                    pass
-
-            # 清理进度消息
-            try:
-                await progress_msg.delete()
-            except:
-                pass
-            
-            # 记录成功日志
-            self.security.log_generation(user_id, username, prompt, True)
-            self.security.complete_task(task_id, "success")
-            
-        else:
-            await progress_msg.edit_text(TextContent.GENERATE_FAIL.format(error=result, prompt=prompt[:50]))
-            
-            # 记录失败日志
-            self.security.log_generation(user_id, username, prompt, False, str(result) if not isinstance(result, str) else result)
-            self.security.complete_task(task_id, f"failed: {result}")
-    
-    @require_auth
-    async def regenerate_image_with_last_prompt_task(self, update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
-        """重新生成上一个提示词的图片"""
-        if update.effective_user is None or update.message is None:
-            return
-        user_id: str = str(update.effective_user.id)
-        username = update.effective_user.username or update.effective_user.first_name
-        if self.last_prompt is not None:
-            await self.generate_image_task(user_id, username, self.last_prompt, update.message)
-        else:
-            await update.message.reply_text(TextContent.NO_LAST_PROMPT)
-    
-    async def interrupt_generation(self, query: CallbackQuery, task_id: str) -> None:
-        """中断生成任务"""
-        success = await self.sd_controller.interrupt_generation()
-        
-        if success:
-            self.security.complete_task(task_id, "interrupted")
-            await query.edit_message_text(TextContent.INTERRUPT_SUCCESS.format(task_id=task_id))
-        else:
-            await query.edit_message_text(TextContent.INTERRUPT_FAIL.format(task_id=task_id))
-
-    async def enhance_image_hr(self, query: CallbackQuery, user_id: str, task_id: str) -> None:
-        """基于快照参数，启用高清修复重新生成。"""
-        snapshot = self.task_snapshots.get(task_id)
-        if not snapshot:
-            await query.answer("找不到该任务的参数，无法高清化", show_alert=True)
-            return
-
-        # 从快照参数出发，避免被用户此后改动影响
-        generation_params_dict: Dict[str, Any] = dict(snapshot['params'])
-        # 强制高清修复（不依赖表单状态）
-        h = Config.HIRES_DEFAULTS
-        generation_params_dict['enable_hr'] = True
-        generation_params_dict['hr_scale'] = h['hr_scale']
-        generation_params_dict['hr_upscaler'] = h['hr_upscaler']
-        generation_params_dict['denoising_strength'] = h['denoising_strength']
-        total_steps = int(generation_params_dict.get('steps', 20) or 20)
-        generation_params_dict['hr_second_pass_steps'] = max(1, int(total_steps * h['hr_second_pass_ratio']))
-        generation_params_dict['hr_resize_x'] = h['hr_resize_x']
-        generation_params_dict['hr_resize_y'] = h['hr_resize_y']
-
-        # 复用快照中的原始提示词
-        original_prompt = snapshot.get('prompt') or self.last_prompt or ""
-        try:
-            await query.edit_message_text("✨ 正在对图片进行高清化...")
-        except Exception:
-            # 可能因为原消息是图片没有文本，无法 edit_text，退化为发送一条新进度消息
-            if query.message is not None:
-                await query.message.reply_text("✨ 正在对图片进行高清化...")
-
-        # 直接发起新任务（使用当前消息作为 message 容器），并覆盖参数为快照参数 + 强制高清修复
-        await self.generate_image_task(
-            user_id,
-            query.from_user.username or query.from_user.first_name,
-            original_prompt,
-            query.message,
-            from_form=False,
-            override_params=generation_params_dict,
-        )
-    
-    async def help_command(self, update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
-        """帮助命令"""
-        if update.message is not None:
-            await update.message.reply_text(TextContent.HELP)
-    
-    def run(self) -> None:
-        """运行机器人"""
-        if not Config.BOT_TOKEN:
-            logger.error("请在 .env 文件中设置 BOT_TOKEN")
-            return
-        
-        if not Config.AUTHORIZED_USERS:
-            logger.error("请在 .env 文件中设置 AUTHORIZED_USERS")
-            return
-        
-        self.application = Application.builder().token(Config.BOT_TOKEN).build()  # type: ignore[assignment]
-        
-        # 添加处理器
-        self.application.add_handler(CommandHandler("start", self.start))  # type: ignore[arg-type]
-        self.application.add_handler(CommandHandler("re", self.regenerate_image_with_last_prompt_task))  # type: ignore[arg-type]
-        self.application.add_handler(CommandHandler("help", self.help_command))  # type: ignore[arg-type]
-        self.application.add_handler(CallbackQueryHandler(self.handle_callback))  # type: ignore[arg-type]
-        self.application.add_handler(MessageHandler(filters.TEXT & ~filters.COMMAND, self.handle_text_prompt))  # type: ignore[arg-type]
-        
-        logger.info("Stable Diffusion 控制机器人启动中...")
-        logger.info(f"SD WebUI API: {Config.SD_API_URL}")
+import atexit
+import functools
+import logging
+import random
+import uuid
+from collections import ChainMap, OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from dataclasses import dataclass
+from typing import Optional, Dict, Any, Deque, Mapping, Tuple, Set, TypedDict, cast
+import io
+from telegram import Update, InlineKeyboardMarkup, Message, CallbackQuery
+from telegram.ext import Application, CommandHandler, MessageHandler, CallbackQueryHandler, filters, ContextTypes
+from security import SecurityManager, require_auth
+from sd_controller import StableDiffusionController
+from config import Config, UserSettings
+from keyboards import Keyboards, CallbackData, CALLBACK_PREFIXES, PREFIX_RE
+from user_manager import UserManager
+from form_manager import FormManager
+from utils import safe_call
+from text_content import TextContent
+import asyncio
+import json
+import os
+
+try:
+    import orjson
+except ImportError:  # orjson 为可选依赖，缺失时回退到标准库 json
+    orjson = None
+
+
+# 日志级别可用环境变量 LOG_LEVEL 调整（如 DEBUG 查看 SD API 探测细节）
+logging.basicConfig(
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
+    level=getattr(logging, os.getenv('LOG_LEVEL', 'INFO').upper(), logging.INFO)
+)
+logging.getLogger("httpx").setLevel(logging.WARNING)
+logger = logging.getLogger(__name__)
+
+# 模块级随机数生成器，供随机 seed 与随机提示词复用
+_RNG = random.Random()
+
+def _str_or_empty(v: Any) -> str:
+    return v if isinstance(v, str) else ""
+
+def _truncate(text: str, limit: int) -> str:
+    """超过 limit 个字符时截断并追加省略号"""
+    return text[:limit] + '...' if len(text) > limit else text
+
+@functools.lru_cache(maxsize=512)
+def _welcome_text(username: str, online: bool) -> str:
+    """欢迎文本只取决于用户名与 SD 在线状态，缓存格式化结果"""
+    return TextContent.WELCOME.format(
+        username=username,
+        status=TextContent.STATUS_ONLINE if online else TextContent.STATUS_OFFLINE
+    )
+
+# 前缀 -> 名称，配合 PREFIX_RE 的匹配结果查分发表
+_PREFIX_NAMES: Dict[str, str] = dict(CALLBACK_PREFIXES)
+
+# 表单摘要模板的绑定方法，format_map 直接使用 summary，省去 ** 解包
+_format_form_summary = TextContent.FORM_SUMMARY.format_map
+
+# 生图热路径上的文本模板，预先绑定 format 方法
+_format_generate_progress = TextContent.GENERATE_PROGRESS.format
+_format_generate_caption = TextContent.GENERATE_CAPTION.format
+_format_generate_fail = TextContent.GENERATE_FAIL.format
+
+# 快照中保留的参数键（对 SD 生成有用、可复用）
+_SNAPSHOT_KEYS: Tuple[str, ...] = ('negative_prompt', 'seed', 'width', 'height', 'steps', 'cfg_scale', 'sampler_name')
+_MISSING = object()
+
+# 快照缓存文件的结构版本，写入文件头用于加载时跳过逐条校验
+_SNAPSHOT_SCHEMA_VERSION = 1
+
+def _dumps_snapshots(data: Dict[str, Any]) -> bytes:
+    """序列化快照缓存（优先使用 orjson）"""
+    if orjson is not None:
+        return orjson.dumps(data, option=orjson.OPT_NON_STR_KEYS | orjson.OPT_INDENT_2)
+    return json.dumps(data, ensure_ascii=False, indent=2).encode('utf-8')
+
+_loads_snapshots = orjson.loads if orjson is not None else json.loads
+
+class SnapshotParams(TypedDict, total=False):
+    negative_prompt: str
+    seed: int
+    width: int
+    height: int
+    steps: int
+    cfg_scale: float
+    sampler_name: str
+
+class TaskSnapshot(TypedDict):
+    prompt: str
+    params: SnapshotParams
+
+@dataclass(slots=True)
+class TaskRecord:
+    """单个生成任务的结果与参数（点赞保存、高清化复用）"""
+    result: Dict[str, Any]
+    params: Dict[str, Any]
+
+class TelegramBot:
+    __slots__ = (
+        "security", "sd_controller", "user_manager", "form_manager",
+        "application", "last_prompt", "user_last_photo_msg",
+        "tasks", "task_snapshots", "user_recent_photo_msgs",
+        "_snapshot_cache_file", "_snapshots_dirty", "waiting_for_negative_prompt",
+    )
+
+    application: Optional[Application]  # type: ignore[type-arg]
+    last_prompt: Optional[str]
+    user_last_photo_msg: Dict[int, int]
+    security: SecurityManager
+    sd_controller: StableDiffusionController
+    user_manager: UserManager
+    form_manager: FormManager
+
+    def __init__(self) -> None:
+        # 快照缓存文件在后台线程中预读，与各 manager 的初始化重叠
+        self._snapshot_cache_file = os.path.join(Config.DATA_DIR, 'snapshots.json')
+        with ThreadPoolExecutor(max_workers=1) as executor:
+            snapshot_blob = executor.submit(self._read_snapshots_blob)
+
+            self.security = SecurityManager()
+            self.sd_controller = StableDiffusionController()
+            self.user_manager = UserManager(Config.SD_DEFAULT_PARAMS)
+            self.form_manager = FormManager()
+            self.application = None
+            self.last_prompt = None
+            self.user_last_photo_msg = {}
+            # 记录任务ID与对应结果、生成参数，供点赞保存使用，避免并发串任务
+            # LRU：访问时移到末尾，超出 TASK_CACHE_LIMIT 时淘汰最久未使用的任务
+            self.tasks: OrderedDict[str, TaskRecord] = OrderedDict()
+            # 每个任务的完整快照，便于复用与溯源
+            self.task_snapshots: OrderedDict[str, TaskSnapshot] = OrderedDict()
+            # 快照有未落盘的修改，由后台任务定期写入
+            self._snapshots_dirty = False
+            # 每个用户最近包含点赞按钮的图片消息 (最多10条)
+            self.user_recent_photo_msgs: Dict[int, Deque[Tuple[int, int]]] = {}
+
+            # 在启动时加载快照缓存
+            try:
+                blob = snapshot_blob.result()
+                if blob is not None:
+                    raw = cast(Dict[str, Any], _loads_snapshots(blob))
+                    if raw.get('__v') == _SNAPSHOT_SCHEMA_VERSION and isinstance(raw.get('snapshots'), dict):
+                        # 带版本头的文件由本程序写入，结构可信，跳过逐条校验
+                        self.task_snapshots = OrderedDict(
+                            list(raw['snapshots'].items())[-Config.SNAPSHOT_CACHE_LIMIT:]
+                        )
+                    else:
+                        # 旧格式或版本不符：运行时校验结构
+                        snapshots: OrderedDict[str, TaskSnapshot] = OrderedDict()
+                        items: list[tuple[str, Any]] = list(raw.items())[-Config.SNAPSHOT_CACHE_LIMIT:]
+                        for k, v in items:
+                            if isinstance(v, dict) and 'prompt' in v and 'params' in v and isinstance(v['params'], dict):
+                                snapshots[str(k)] = cast(TaskSnapshot, v)
+                        self.task_snapshots = snapshots
+            except Exception:
+                pass
+        self.waiting_for_negative_prompt: Set[int] = set()
+
+    def _read_snapshots_blob(self) -> Optional[bytes]:
+        """读取快照缓存文件原始内容（文件不存在时返回 None）"""
+        try:
+            with open(self._snapshot_cache_file, 'rb') as f:
+                return f.read()
+        except FileNotFoundError:
+            return None
+
+    # 下面的代码只做流程分发，具体逻辑交给 manager/controller
+    def create_main_menu(self) -> InlineKeyboardMarkup:
+        return Keyboards.main_menu()
+
+    def create_generation_menu(self) -> InlineKeyboardMarkup:
+        return Keyboards.generation_menu()
+
+    def create_resolution_menu(self, user_id: int) -> InlineKeyboardMarkup:
+        current_settings: UserSettings = self.user_manager.get_settings(user_id)
+        current_res = f"{current_settings['width']}x{current_settings['height']}"
+        return Keyboards.resolution_menu(current_res)
+
+    def get_user_settings(self, user_id: int) -> UserSettings:
+        return self.user_manager.get_settings(user_id)
+
+    async def start(self, update: Update, _: ContextTypes.DEFAULT_TYPE) -> None:
+        """开始命令处理"""
+        if update.effective_user is None or update.message is None:
+            return
+        user = update.effective_user
+        user_id: int = user.id
+        if not self.security.is_authorized_user(user_id):
+            await update.message.reply_text(
+                TextContent.USER_UNAUTHORIZED.format(username=user.username, userid=user.id)
+            )
+            return
+        sd_status = await self.sd_controller.check_api_status()
+        await update.message.reply_text(
+            _welcome_text(user.first_name, bool(sd_status)),
+            reply_markup=Keyboards.main_menu()
+        )
+
+    @require_auth
+    async def handle_callback(self, update: Update, _: ContextTypes.DEFAULT_TYPE) -> None:
+        """处理回调按钮"""
+        query = update.callback_query
+        if query is None:
+            return
+        user_id: int = query.from_user.id
+        await query.answer()
+        
+        data_opt = query.data
+        if data_opt is None:
+            return
+        data: str = data_opt
+
+        prefixed = PREFIX_RE.match(data)
+        if prefixed is not None:
+            # 带参数的回调统一走前缀分发
+            prefix, arg = prefixed.groups()
+            await self._PREFIX_HANDLERS[_PREFIX_NAMES[prefix]](self, query, user_id, data, arg)
+        elif data == CallbackData.MAIN_MENU:
+            # main_menu
+            sd_status = await self.sd_controller.check_api_status()
+            await query.edit_message_text(
+                _welcome_text(query.from_user.first_name, bool(sd_status)),
+                reply_markup=Keyboards.main_menu()
+            )
+        elif data == CallbackData.TXT2IMG:
+            # txt2img
+            await query.edit_message_text(
+                TextContent.GENERATION_MENU,
+                reply_markup=Keyboards.generation_menu()
+            )
+        elif data == CallbackData.INPUT_PROMPT:
+            # input_prompt
+            user_settings: UserSettings = self.get_user_settings(user_id)
+            await query.edit_message_text(
+                TextContent.INPUT_PROMPT.format(
+                    resolution=f"{user_settings['width']}x{user_settings['height']}"
+                )
+            )
+        elif data == CallbackData.RANDOM_GENERATE:
+            # random_generate
+            await self.random_generate(query)
+        elif data == CallbackData.ADVANCED_FORM:
+            # advanced_form - 新增表单功能
+            await self.show_advanced_form(query, user_id)
+        elif data == CallbackData.SD_STATUS:
+            # sd_status
+            await self.show_sd_status(query)
+        elif data == CallbackData.SD_SETTINGS:
+            # sd_settings
+            await self.show_sd_settings(query)
+        elif data == CallbackData.GENERATION_HISTORY:
+            # generation_history
+            await self.show_generation_history(query)
+        elif data == CallbackData.RESOLUTION_SETTINGS:
+            # resolution_settings
+            await self.show_resolution_settings(query, user_id)
+        elif data == CallbackData.NEGATIVE_PROMPT_SETTINGS:
+            # negative_prompt_settings
+            await self.show_negative_prompt_settings(query, user_id)
+        elif data == CallbackData.SET_NEGATIVE_PROMPT:
+            # set_negative_prompt
+            await self.request_negative_prompt_input(query, user_id)
+        elif data == CallbackData.RESET_NEGATIVE_PROMPT:
+            # reset_negative_prompt
+            await self.reset_negative_prompt(query, user_id)
+        elif data == CallbackData.CANCEL_NEGATIVE_PROMPT:
+            # cancel_negative_prompt
+            await self.cancel_negative_prompt_input(query, user_id)
+        # 新增表单相关回调处理
+        elif data == CallbackData.FORM_SET_PROMPT:
+            # form_set_prompt
+            await self.request_form_prompt_input(query, user_id)
+        elif data == CallbackData.FORM_SET_RESOLUTION_MENU:
+            # form_set_resolution_menu
+            await self.show_form_resolution_menu(query, user_id)
+        elif data == CallbackData.FORM_SET_SEED:
+            # form_set_seed
+            await self.request_form_seed_input(query, user_id)
+        elif data == CallbackData.FORM_TOGGLE_HIRES:
+            # form_toggle_hires
+            await self.toggle_form_hires(query, user_id)
+        elif data == CallbackData.FORM_GENERATE:
+            # form_generate
+            await self.generate_from_form(query, user_id)
+        elif data == CallbackData.FORM_RESET:
+            # form_reset
+            await self.reset_form(query, user_id)
+        elif data == CallbackData.FORM_CANCEL_INPUT:
+            # form_cancel_input
+            await self.cancel_form_input(query, user_id)
+
+    # 带参数回调的处理函数，签名统一为 (query, user_id, data, arg)
+    async def _on_like(self, query: CallbackQuery, user_id: int, data: str, task_id: str) -> None:
+        """like_{task_id}"""
+        record = self.tasks.get(task_id)
+        save_task: Optional["asyncio.Task[Optional[str]]"] = None
+        if record is not None:
+            # 最近使用的任务移到末尾，淘汰时优先移除久未访问的
+            self.tasks.move_to_end(task_id)
+            if record.result:
+                # 本地保存与下面的消息编辑同时进行，最后再等待保存完成
+                save_task = asyncio.create_task(self.sd_controller.save_result_locally(record.result))
+        self.security.complete_task(task_id, "liked")
+        message = query.message
+        if message is not None:
+            caption = message.caption
+            base = _str_or_empty(caption) or _str_or_empty(message.text)
+            new_text = f"{base}{TextContent.LIKED_CAPTION_APPEND}"
+            # photo 在 PTB 20 中缺省为空元组而非 None，按真值判断
+            has_media = bool(message.photo or message.video or message.document)
+
+            try:
+                if has_media or caption is not None:
+                    await query.edit_message_caption(new_text, reply_markup=None)
+                else:
+                    await query.edit_message_text(new_text, reply_markup=None)
+            except Exception:
+                pass
+        if save_task is not None:
+            await save_task
+
+    async def _on_enhance_hr(self, query: CallbackQuery, user_id: int, data: str, task_id: str) -> None:
+        """enhance_hr_{task_id}"""
+        await self.enhance_image_hr(query, user_id, task_id)
+
+    async def _on_set_resolution(self, query: CallbackQuery, user_id: int, data: str, res: str) -> None:
+        """set_resolution_{res}"""
+        await self.set_resolution(query, data, user_id)
+
+    async def _on_interrupt(self, query: CallbackQuery, user_id: int, data: str, task_id: str) -> None:
+        """interrupt_{task_id}"""
+        await self.interrupt_generation(query, task_id)
+
+    async def _on_form_set_resolution(self, query: CallbackQuery, user_id: int, data: str, res: str) -> None:
+        """form_set_resolution_{res}"""
+        await self.set_form_resolution(query, data, user_id)
+
+    # 名称与 keyboards.CALLBACK_PREFIXES 一致
+    _PREFIX_HANDLERS = {
+        "like": _on_like,
+        "enhance_hr": _on_enhance_hr,
+        "set_resolution": _on_set_resolution,
+        "interrupt": _on_interrupt,
+        "form_set_resolution": _on_form_set_resolution,
+    }
+
+    # 原有方法保持不变
+    async def show_resolution_settings(self, query: CallbackQuery, user_id: int) -> None:
+        """显示分辨率设置菜单"""
+        user_settings: UserSettings = self.get_user_settings(user_id)
+        current_res = f"{user_settings['width']}x{user_settings['height']}"
+        text = TextContent.RESOLUTION_SETTINGS.format(resolution=current_res)
+        await query.edit_message_text(
+            text,
+            reply_markup=Keyboards.resolution_menu(current_res)
+        )
+
+    async def set_resolution(self, query: CallbackQuery, callback_data: str, user_id: int) -> None:
+        """设置用户分辨率"""
+        parts = callback_data.split("_")
+        width = int(parts[2])
+        height = int(parts[3])
+        user_settings: UserSettings = self.get_user_settings(user_id)
+        user_settings['width'] = width
+        user_settings['height'] = height
+        await query.edit_message_text(
+            TextContent.RESOLUTION_SET.format(width=width, height=height),
+            reply_markup=Keyboards.resolution_menu(f"{width}x{height}")
+        )
+
+    async def random_generate(self, query: CallbackQuery) -> None:
+        """随机生成图片"""
+        prompt: str = _RNG.choice(TextContent.RANDOM_PROMPTS)
+        await query.edit_message_text(TextContent.RANDOM_GENERATE.format(prompt=prompt))
+        user_id: int = query.from_user.id
+        username: str = query.from_user.username or query.from_user.first_name
+        await self.generate_image_task(user_id, username, prompt, query.message)
+
+    async def show_sd_status(self, query: CallbackQuery) -> None:
+        """显示SD WebUI状态"""
+        # 在线状态与当前模型来自同一次 options 请求
+        api_status, current_model = await self.sd_controller.fetch_status_and_model()
+        
+        if api_status:
+            models = await self.sd_controller.get_models()
+            samplers = await self.sd_controller.get_samplers()
+            progress, eta = await self.sd_controller.get_progress()
+            eta_text = TextContent.ETA_TEXT.format(eta=eta) if eta > 0 else ""
+            status_text = TextContent.SD_STATUS_ONLINE.format(
+                current_model=current_model,
+                model_count=len(models),
+                sampler_count=len(samplers),
+                progress=progress*100,
+                eta_text=eta_text
+            )
+        else:
+            status_text = TextContent.SD_STATUS_OFFLINE.format(api_url=Config.SD_API_URL)
+        
+        keyboard = Keyboards.main_menu()
+        await query.edit_message_text(
+            status_text,
+            reply_markup=keyboard
+        )
+    
+    async def show_sd_settings(self, query: CallbackQuery) -> None:
+        """显示SD设置信息"""
+        user_id: int = query.from_user.id
+        user_settings: UserSettings = self.get_user_settings(user_id)
+        
+        settings_text = TextContent.SD_SETTINGS.format(
+            width=user_settings['width'],
+            height=user_settings['height'],
+            steps=user_settings['steps'],
+            cfg_scale=user_settings['cfg_scale'],
+            sampler_name=user_settings['sampler_name'],
+            negative_prompt=user_settings['negative_prompt'][:100] + "..."
+        )
+        
+        keyboard = Keyboards.sd_setting_menu()
+        await query.edit_message_text(
+            settings_text,
+            reply_markup=keyboard
+        )
+    
+    async def show_generation_history(self, query: CallbackQuery) -> None:
+        """显示生成历史"""
+        history = self.security.generation_history
+        count = len(history)
+        if count:
+            text = TextContent.GENERATION_HISTORY_HEADER
+            # 最近5条，按列直接取值
+            for i in range(count - 1, max(count - 5, 0) - 1, -1):
+                timestamp = datetime.fromtimestamp(history.timestamps[i]).strftime("%H:%M:%S")
+                success = history.successes[i]
+                error = history.errors[i]
+                status = "✅" if success else "❌"
+                text += f"{status} {timestamp} - {history.usernames[i]}\n"
+                text += f"💭 {history.prompts[i]}\n"
+                if not success and error:
+                    text += f"⚠️ {error}\n"
+                text += "\n"
+        else:
+            text = TextContent.GENERATION_HISTORY_EMPTY
+        
+        keyboard = Keyboards.main_menu()
+        await query.edit_message_text(
+            text,
+            reply_markup=keyboard
+        )
+    
+    async def show_negative_prompt_settings(self, query: CallbackQuery, user_id: int) -> None:
+        """显示负面词设置菜单"""
+        user_settings: UserSettings = self.get_user_settings(user_id)
+        current_negative_prompt = user_settings['negative_prompt']
+        
+        # 截断显示长负面词
+        display_negative_prompt = current_negative_prompt
+        if len(display_negative_prompt) > 200:
+            display_negative_prompt = display_negative_prompt[:200] + "..."
+        
+        text = TextContent.NEGATIVE_PROMPT_SETTINGS.format(
+            negative_prompt=display_negative_prompt
+        )
+        await query.edit_message_text(
+            text,
+            reply_markup=Keyboards.negative_prompt_menu()
+        )
+
+    async def request_negative_prompt_input(self, query: CallbackQuery, user_id: int) -> None:
+        """请求用户输入自定义负面词"""
+        self.waiting_for_negative_prompt.add(user_id)
+        await query.edit_message_text(
+            TextContent.INPUT_NEGATIVE_PROMPT,
+            reply_markup=Keyboards.negative_prompt_input_menu()
+        )
+
+    async def reset_negative_prompt(self, query: CallbackQuery, user_id: int) -> None:
+        """重置用户负面词为默认值"""
+        self.user_manager.reset_negative_prompt(user_id)
+        default_negative_prompt = Config.SD_DEFAULT_PARAMS['negative_prompt']
+        
+        # 截断显示
+        display_negative_prompt = default_negative_prompt
+        if len(display_negative_prompt) > 200:
+            display_negative_prompt = display_negative_prompt[:200] + "..."
+            
+        await query.edit_message_text(
+            TextContent.NEGATIVE_PROMPT_RESET.format(
+                negative_prompt=display_negative_prompt
+            ),
+            reply_markup=Keyboards.negative_prompt_menu()
+        )
+
+    async def handle_negative_prompt_input(self, update: Update, user_id: int, negative_prompt: str) -> None:
+        """处理用户输入的负面词"""
+        self.waiting_for_negative_prompt.discard(user_id)  # 移除等待状态
+        
+        # 验证负面词长度
+        if len(negative_prompt) > 1000:
+            if update.message is not None:
+                await update.message.reply_text(TextContent.NEGATIVE_PROMPT_TOO_LONG)
+            return
+        
+        # 保存负面词
+        self.user_manager.set_negative_prompt(user_id, negative_prompt)
+        
+        # 截断显示
+        display_negative_prompt = negative_prompt
+        if len(display_negative_prompt) > 200:
+            display_negative_prompt = display_negative_prompt[:200] + "..."
+        
+        if update.message is not None:
+            await update.message.reply_text(
+                TextContent.NEGATIVE_PROMPT_SET.format(negative_prompt=display_negative_prompt),
+                reply_markup=Keyboards.negative_prompt_menu()
+            )
+
+    async def cancel_negative_prompt_input(self, query: CallbackQuery, user_id: int) -> None:
+        """取消负面词输入"""
+        self.waiting_for_negative_prompt.discard(user_id)  # 移除等待状态
+        
+        # 获取当前负面词设置并显示设置页面
+        user_settings: UserSettings = self.get_user_settings(user_id)
+        current_negative_prompt = user_settings['negative_prompt']
+        
+        # 截断显示长负面词
+        display_negative_prompt = current_negative_prompt
+        if len(display_negative_prompt) > 200:
+            display_negative_prompt = display_negative_prompt[:200] + "..."
+        
+        cancel_text = TextContent.NEGATIVE_PROMPT_INPUT_CANCELLED + "\n\n" + TextContent.NEGATIVE_PROMPT_SETTINGS.format(
+            negative_prompt=display_negative_prompt
+        )
+        
+        await query.edit_message_text(
+            cancel_text,
+            reply_markup=Keyboards.negative_prompt_menu()
+        )
+
+    # 新增表单相关方法
+    async def show_advanced_form(self, query: CallbackQuery, user_id: int) -> None:
+        """显示高级表单"""
+        form_data = self.form_manager.get_user_form(user_id)
+        summary = self.form_manager.format_form_summary(user_id)
+        
+        text = TextContent.ADVANCED_FORM_TITLE + "\n\n" + _format_form_summary(summary)
+        await query.edit_message_text(
+            text,
+            reply_markup=Keyboards.advanced_form_menu(cast(Dict[str, object], form_data))
+        )
+
+    async def request_form_prompt_input(self, query: CallbackQuery, user_id: int) -> None:
+        """请求表单正面词输入"""
+        self.form_manager.set_input_state(user_id, "prompt")
+        await query.edit_message_text(
+            TextContent.FORM_INPUT_PROMPT,
+            reply_markup=Keyboards.form_input_cancel_menu()
+        )
+
+    async def show_form_resolution_menu(self, query: CallbackQuery, user_id: int) -> None:
+        """显示表单分辨率选择菜单"""
+        form_data = self.form_manager.get_user_form(user_id)
+        current_res_val: str = (form_data.get('resolution') or "")
+        
+        text = TextContent.FORM_RESOLUTION_MENU.format(current_resolution=current_res_val or "未设置")
+        await query.edit_message_text(
+            text,
+            reply_markup=Keyboards.form_resolution_menu(current_res_val)
+        )
+
+    async def set_form_resolution(self, query: CallbackQuery, callback_data: str, user_id: int) -> None:
+        """设置表单分辨率"""
+        # 解析 form_set_resolution_1024_1024 格式
+        parts = callback_data.split("_")
+        width = int(parts[3])
+        height = int(parts[4])
+        resolution = f"{width}x{height}"
+        
+        self.form_manager.update_form_field(user_id, 'resolution', resolution)
+        
+        await query.edit_message_text(
+            TextContent.FORM_RESOLUTION_SET.format(resolution=resolution),
+            reply_markup=Keyboards.form_resolution_menu(resolution)
+        )
+
+    async def request_form_seed_input(self, query: CallbackQuery, user_id: int) -> None:
+        """请求表单种子输入"""
+        self.form_manager.set_input_state(user_id, "seed")
+        await query.edit_message_text(
+            TextContent.FORM_INPUT_SEED,
+            reply_markup=Keyboards.form_input_cancel_menu()
+        )
+
+    async def toggle_form_hires(self, query: CallbackQuery, user_id: int) -> None:
+        """切换表单高清修复选项"""
+        form_data = self.form_manager.get_user_form(user_id)
+        current_hires = form_data.get('hires_fix', False)
+        new_hires = not current_hires
+        
+        self.form_manager.update_form_field(user_id, 'hires_fix', new_hires)
+        
+        message = TextContent.FORM_HIRES_ENABLED if new_hires else TextContent.FORM_HIRES_DISABLED
+        
+        # 更新表单显示
+        summary = self.form_manager.format_form_summary(user_id)
+        text = message + "\n\n" + _format_form_summary(summary)
+        
+        await query.edit_message_text(
+            text,
+            reply_markup=Keyboards.advanced_form_menu(cast(Dict[str, object], form_data))
+        )
+
+    async def generate_from_form(self, query: CallbackQuery, user_id: int) -> None:
+        """从表单生成图片"""
+        username = query.from_user.username or query.from_user.first_name
+        
+        # 获取提示词
+        prompt = self.form_manager.get_prompt_from_form(user_id, TextContent.RANDOM_PROMPTS)
+        
+        await query.edit_message_text(
+            f"🚀 正在使用表单设置生成图片...\n💭 {_truncate(prompt, 50)}"
+        )
+        
+        # 生成图片，传递表单数据标识
+        await self.generate_image_task(user_id, username, prompt, query.message, from_form=True)
+
+    async def reset_form(self, query: CallbackQuery, user_id: int) -> None:
+        """重置表单"""
+        self.form_manager.reset_user_form(user_id)
+        
+        form_data = self.form_manager.get_user_form(user_id)
+        summary = self.form_manager.format_form_summary(user_id)
+        
+        text = TextContent.FORM_RESET_SUCCESS + "\n\n" + _format_form_summary(summary)
+        await query.edit_message_text(
+            text,
+            reply_markup=Keyboards.advanced_form_menu(cast(Dict[str, object], form_data))
+        )
+
+    async def cancel_form_input(self, query: CallbackQuery, user_id: int) -> None:
+        """取消表单输入"""
+        self.form_manager.clear_input_state(user_id)
+        
+        # 返回表单页面
+        form_data = self.form_manager.get_user_form(user_id)
+        summary = self.form_manager.format_form_summary(user_id)
+        
+        text = TextContent.FORM_INPUT_CANCELLED + "\n\n" + _format_form_summary(summary)
+        await query.edit_message_text(
+            text,
+            reply_markup=Keyboards.advanced_form_menu(cast(Dict[str, object], form_data))
+        )
+
+    async def handle_form_input(self, update: Update, user_id: int, input_text: str) -> None:
+        """处理表单输入"""
+        input_state = self.form_manager.get_input_state(user_id)
+        
+        if input_state == "prompt":
+            await self.handle_form_prompt_input(update, user_id, input_text)
+        elif input_state == "seed":
+            await self.handle_form_seed_input(update, user_id, input_text)
+
+    async def handle_form_prompt_input(self, update: Update, user_id: int, prompt: str) -> None:
+        """处理表单正面词输入"""
+        self.form_manager.clear_input_state(user_id)
+        
+        if prompt.lower().strip() == 'skip':
+            self.form_manager.update_form_field(user_id, 'prompt', None)
+            message = TextContent.FORM_PROMPT_SKIPPED
+        else:
+            self.form_manager.update_form_field(user_id, 'prompt', prompt)
+            message = TextContent.FORM_PROMPT_SET.format(prompt=_truncate(prompt, 50))
+        
+        # 返回表单页面
+        form_data = self.form_manager.get_user_form(user_id)
+        summary = self.form_manager.format_form_summary(user_id)
+        text = message + "\n\n" + _format_form_summary(summary)
+        
+        if update.message is None:
+            return
+        assert update.message is not None
+        await update.message.reply_text(
+            text,
+            reply_markup=Keyboards.advanced_form_menu(cast(Dict[str, object], form_data))
+        )
+
+    async def handle_form_seed_input(self, update: Update, user_id: int, seed_text: str) -> None:
+        """处理表单种子输入"""
+        self.form_manager.clear_input_state(user_id)
+        
+        is_valid, seed_value, status = self.form_manager.validate_seed(seed_text)
+        
+        if not is_valid:
+            if update.message is not None:
+                await update.message.reply_text(TextContent.FORM_SEED_INVALID)
+            return
+        
+        self.form_manager.update_form_field(user_id, 'seed', seed_value)
+        
+        if status == "已跳过":
+            message = TextContent.FORM_SEED_SKIPPED
+        elif status == "随机":
+            message = TextContent.FORM_SEED_RANDOM
+        else:
+            message = TextContent.FORM_SEED_SET.format(seed=seed_value)
+        
+        # 返回表单页面
+        form_data = self.form_manager.get_user_form(user_id)
+        summary = self.form_manager.format_form_summary(user_id)
+        text = message + "\n\n" + _format_form_summary(summary)
+        
+        if update.message is None:
+            return
+        await update.message.reply_text(
+            text,
+            reply_markup=Keyboards.advanced_form_menu(cast(Dict[str, object], form_data))
+        )
+
+    @safe_call
+    @require_auth
+    async def handle_text_prompt(self, update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+        """处理文本提示词"""
+        
+        if update.message is None or update.effective_user is None:
+            return
+        text_val = update.message.text
+        if text_val is None:
+            return
+        prompt: str = text_val.strip()
+        user_id: int = update.effective_user.id
+        username: str = update.effective_user.username or update.effective_user.first_name
+        
+        # 检查是否在等待表单输入
+        if self.form_manager.is_waiting_for_input(user_id):
+            await self.handle_form_input(update, user_id, prompt)
+            return
+        
+        if user_id in self.waiting_for_negative_prompt:
+            await self.handle_negative_prompt_input(update, user_id, prompt)
+            return
+
+        # 不再清理上一条消息的按钮，改为保留最近10条的点赞按钮，超出时再移除旧的
+
+        if prompt.startswith('/'):
+            return  # 忽略命令
+
+        # 仅输入数字：重复执行“重新生成上一个提示词”的功能，次数限制在配置上限
+        if prompt.isdigit():
+            n = int(prompt)
+            n = max(1, min(n, Config.REGENERATE_MAX_RUNS))
+            if self.last_prompt is None:
+                await update.message.reply_text(TextContent.NO_LAST_PROMPT)
+                return
+            for _ in range(n):
+                # 队列限制检查
+                if self.security.get_queue_size() >= Config.MAX_QUEUE_SIZE:
+                    await update.message.reply_text(TextContent.QUEUE_FULL)
+                    break
+                # 频控
+                limit, limit_msg = self.security.check_generation_limit(user_id)
+                if not limit:
+                    await update.message.reply_text(limit_msg + "\n\n")
+                    break
+                await self.generate_image_task(user_id, username, self.last_prompt, update.message)
+            return
+        
+        # 安全检查
+        safe, safety_msg = self.security.is_safe_prompt(prompt)
+        if not safe:
+            await update.message.reply_text(TextContent.PROMPT_UNSAFE.format(msg=safety_msg))
+            return
+        
+        limit, limit_msg = self.security.check_generation_limit(user_id)
+        if not limit:
+            await update.message.reply_text(limit_msg + "\n\n")
+            return
+        
+        # 队列限制检查
+        if self.security.get_queue_size() >= Config.MAX_QUEUE_SIZE:
+            await update.message.reply_text(TextContent.QUEUE_FULL)
+            return
+
+        # 开始生成
+        await self.generate_image_task(user_id, username, prompt, update.message)
+    
+    @safe_call
+    async def generate_image_task(self, user_id: int, username: str, prompt: str, message: Message, from_form: bool = False, override_params: Optional[Mapping[str, Any]] = None) -> None:
+        """生成图片任务"""
+        task_id = str(uuid.uuid4())[:8]
+        self.last_prompt = prompt  # 保存最后的提示词
+        
+        # 获取用户自定义设置
+        user_settings: UserSettings = self.get_user_settings(user_id)
+        
+        # 生成参数来源优先级：override_params > 表单参数 > 用户设置
+        generation_params: Dict[str, Any]
+        if override_params is not None:
+            # 分层参数只在此处展开一次
+            generation_params = dict(ChainMap(cast(Dict[str, Any], override_params), cast(Dict[str, Any], user_settings)))
+        elif from_form:
+            generation_params = self.form_manager.generate_params_from_form(user_id, user_settings)
+        else:
+            generation_params = dict(user_settings)
+        
+        # 自动生成随机seed（除非用户已指定）
+        if 'seed' not in generation_params or generation_params['seed'] is None:
+            # 31 位随机数即 32 位有符号整数的正数范围，0 时取 1
+            generation_params['seed'] = _RNG.getrandbits(31) or 1
+        
+        # 添加到安全管理器
+        self.security.add_task(task_id, user_id, prompt)
+        self.security.add_generation_record(user_id)
+        
+        # 创建中断按钮
+        keyboard = Keyboards.interrupt_keyboard(task_id)
+        reply_markup = keyboard
+        
+        # 显示生成进度
+        progress_msg = await message.reply_text(
+            _format_generate_progress(
+                task_id=task_id,
+                prompt=_truncate(prompt, 50),
+                resolution=f"{generation_params['width']}x{generation_params['height']}"
+            ),
+            reply_markup=reply_markup
+        )
+        
+        # 调用SD API生成图片，使用生成参数
+        # 将 negative_prompt 单独取出（generation_params 是本任务新建的字典，可直接修改）
+        neg_prompt_any = generation_params.pop('negative_prompt', None)
+        neg_prompt: Optional[str] = neg_prompt_any if isinstance(neg_prompt_any, str) else None
+        success, result = await self.sd_controller.generate_image(
+            prompt,
+            neg_prompt,
+            **generation_params
+        )
+        # 放回负面词，供任务记录与快照使用
+        if neg_prompt_any is not None:
+            generation_params['negative_prompt'] = neg_prompt_any
+        
+        if success:
+            await progress_msg.edit_text(TextContent.GENERATE_SUCCESS)
+            
+            # 构建标题，如果是表单生成则显示更多信息
+            if from_form:
+                form_data = self.form_manager.get_user_form(user_id)
+                seed_info = f"🎲 种子: {generation_params['seed']}"
+                hires_info = f"🔍 高清修复: {'开启' if bool(form_data.get('hires_fix')) else '关闭'}"
+                caption = _format_generate_caption(
+                    prompt=prompt,
+                    resolution=f"{generation_params['width']}x{generation_params['height']}"
+                ) + f"\n{seed_info}\n{hires_info}"
+            else:
+                caption = _format_generate_caption(
+                    prompt=prompt,
+                    resolution=f"{generation_params['width']}x{generation_params['height']}"
+                )
+            
+            image_bytes, api_result = cast(Tuple[io.BytesIO, Dict[str, Any]], result)
+            # 记录任务结果
+            self.tasks[task_id] = TaskRecord(api_result, generation_params)
+            while len(self.tasks) > Config.TASK_CACHE_LIMIT:
+                self.tasks.popitem(last=False)
+            # 判断是否本次已启用高清修复
+            is_hr_enabled = bool(generation_params.get('enable_hr'))
+            reply_markup = Keyboards.like_keyboard(task_id, show_enhance=not is_hr_enabled)
+            try:
+                sent_msg = await message.reply_photo(
+                    photo=image_bytes,
+                    caption=caption,
+                    reply_markup=reply_markup
+                )
+            finally:
+                # 上传完成后立即释放图片缓冲区，不等待本协程结束
+                image_bytes.close()
+            
+            self.user_last_photo_msg[user_id] = sent_msg.message_id
+
+            # 快照：仅保存对 SD 生成有用的参数（可复用）
+            params_snapshot = {
+                k: v for k in _SNAPSHOT_KEYS
+                for v in (generation_params.get(k, _MISSING),) if v is not _MISSING
+            }
+            params_snapshot_t: SnapshotParams = cast(SnapshotParams, params_snapshot)
+            self.task_snapshots[task_id] = {
+                'prompt': prompt,
+                'params': params_snapshot_t,
+            }
+
+            # 裁剪：仅保留最新的 SNAPSHOT_CACHE_LIMIT 条
+            while len(self.task_snapshots) > Config.SNAPSHOT_CACHE_LIMIT:
+                self.task_snapshots.popitem(last=False)
+            # 标记待落盘，由后台任务批量写入磁盘缓存
+            self._snapshots_dirty = True
+
+            # 维护最近10条带点赞按钮的图片消息
+            chat_id = message.chat_id
+            dq = self.user_recent_photo_msgs.get(user_id)
+            if dq is None:
+                dq = self.user_recent_photo_msgs[user_id] = deque(maxlen=Config.LIKABLE_MESSAGE_LIMIT)
+            # 写满时 append 会自动挤出最旧的一条，先记下以便移除其按钮
+            evicted = dq[0] if len(dq) == dq.maxlen else None
+            dq.append((chat_id, sent_msg.message_id))
+            if evicted is not None and self.application is not None:  # type: ignore[reportUnknownMemberType]
+                old_chat_id, old_msg_id = evicted
+                try:
+                    if self.application.bot is not None:  # type: ignore[attr-defined]
+                        await self.application.bot.edit_message_reply_markup(  # type: ignore[attr-defined]
+                            chat_id=old_chat_id,
+                            message_id=old_msg_id,
+                            reply_markup=None
+                        )
+                except Exception:
+                    pass
+
+            # 清理进度消息
+            try:
+                await progress_msg.delete()
+            except:
+                pass
+            
+            # 记录成功日志
+            self.security.log_generation(user_id, username, prompt, True)
+            self.security.complete_task(task_id, "success")
+            
+        else:
+            await progress_msg.edit_text(_format_generate_fail(error=result, prompt=prompt[:50]))
+            
+            # 记录失败日志
+            self.security.log_generation(user_id, username, prompt, False, str(result) if not isinstance(result, str) else result)
+            self.security.complete_task(task_id, f"failed: {result}")
+    
+    @require_auth
+    async def regenerate_image_with_last_prompt_task(self, update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+        """重新生成上一个提示词的图片"""
+        if update.effective_user is None or update.message is None:
+            return
+        user_id: int = update.effective_user.id
+        username = update.effective_user.username or update.effective_user.first_name
+        if self.last_prompt is not None:
+            await self.generate_image_task(user_id, username, self.last_prompt, update.message)
+        else:
+            await update.message.reply_text(TextContent.NO_LAST_PROMPT)
+    
+    async def interrupt_generation(self, query: CallbackQuery, task_id: str) -> None:
+        """中断生成任务"""
+        success = await self.sd_controller.interrupt_generation()
+        
+        if success:
+            self.security.complete_task(task_id, "interrupted")
+            await query.edit_message_text(TextContent.INTERRUPT_SUCCESS.format(task_id=task_id))
+        else:
+            await query.edit_message_text(TextContent.INTERRUPT_FAIL.format(task_id=task_id))
+
+    async def enhance_image_hr(self, query: CallbackQuery, user_id: int, task_id: str) -> None:
+        """基于快照参数，启用高清修复重新生成。"""
+        snapshot = self.task_snapshots.get(task_id)
+        if not snapshot:
+            await query.answer("找不到该任务的参数，无法高清化", show_alert=True)
+            return
+        if task_id in self.tasks:
+            self.tasks.move_to_end(task_id)
+
+        # 从快照参数出发，避免被用户此后改动影响；高清参数叠加在上层，不复制快照
+        snapshot_params = cast(Dict[str, Any], snapshot['params'])
+        # 强制高清修复（不依赖表单状态）
+        total_steps = int(snapshot_params.get('steps', 20) or 20)
+        second_pass_steps = max(1, int(total_steps * Config.HIRES_DEFAULTS['hr_second_pass_ratio']))
+        generation_params_layered = ChainMap(
+            {'hr_second_pass_steps': second_pass_steps}, Config.HIRES_OVERRIDE_TEMPLATE, snapshot_params
+        )
+
+        # 复用快照中的原始提示词
+        original_prompt = snapshot.get('prompt') or self.last_prompt or ""
+        try:
+            await query.edit_message_text("✨ 正在对图片进行高清化...")
+        except Exception:
+            # 可能因为原消息是图片没有文本，无法 edit_text，退化为发送一条新进度消息
+            if query.message is not None:
+                await query.message.reply_text("✨ 正在对图片进行高清化...")
+
+        # 直接发起新任务（使用当前消息作为 message 容器），并覆盖参数为快照参数 + 强制高清修复
+        await self.generate_image_task(
+            user_id,
+            query.from_user.username or query.from_user.first_name,
+            original_prompt,
+            query.message,
+            from_form=False,
+            override_params=generation_params_layered,
+        )
+    
+    async def help_command(self, update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+        """帮助命令"""
+        if update.message is not None:
+            await update.message.reply_text(TextContent.HELP)
+    
+    def _write_snapshots_to_disk(self, snapshots: Dict[str, TaskSnapshot]) -> None:
+        """序列化并写入快照缓存（先写临时文件再原子替换），可在工作线程中执行"""
+        os.makedirs(Config.DATA_DIR, exist_ok=True)
+        payload = _dumps_snapshots({'__v': _SNAPSHOT_SCHEMA_VERSION, 'snapshots': snapshots})
+        tmp_file = self._snapshot_cache_file + '.tmp'
+        with open(tmp_file, 'wb') as f:
+            f.write(payload)
+            # 确保数据先落盘再替换，避免崩溃后留下空文件
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_file, self._snapshot_cache_file)
+
+    def _flush_snapshots_sync(self) -> None:
+        """同步落盘有修改的快照（用于进程退出时）"""
+        if not self._snapshots_dirty:
+            return
+        self._snapshots_dirty = False
+        try:
+            self._write_snapshots_to_disk(dict(self.task_snapshots))
+        except Exception as e:
+            self._snapshots_dirty = True
+            logger.warning(f"写入快照缓存失败: {e}")
+
+    async def _flush_snapshots(self) -> None:
+        """在工作线程中落盘有修改的快照，不阻塞事件循环"""
+        if not self._snapshots_dirty:
+            return
+        self._snapshots_dirty = False
+        # 在事件循环线程中取浅拷贝，避免写入期间字典被并发修改
+        snapshots = dict(self.task_snapshots)
+        try:
+            await asyncio.to_thread(self._write_snapshots_to_disk, snapshots)
+        except Exception as e:
+            # 写入失败则保留脏标记，下个周期重试
+            self._snapshots_dirty = True
+            logger.warning(f"写入快照缓存失败: {e}")
+
+    async def _snapshot_flusher(self) -> None:
+        """后台定期落盘快照缓存"""
+        while True:
+            await asyncio.sleep(Config.SNAPSHOT_FLUSH_INTERVAL)
+            await self._flush_snapshots()
+
+    async def _post_init(self, application: Application) -> None:  # type: ignore[type-arg]
+        application.create_task(self._snapshot_flusher())  # type: ignore[attr-defined]
+
+    async def _post_shutdown(self, application: Application) -> None:  # type: ignore[type-arg]
+        await self._flush_snapshots()
+        await self.sd_controller.close()
+
+    def run(self) -> None:
+        """运行机器人"""
+        if not Config.BOT_TOKEN:
+            logger.error("请在 .env 文件中设置 BOT_TOKEN")
+            return
+        
+        if not Config.AUTHORIZED_USERS:
+            logger.error("请在 .env 文件中设置 AUTHORIZED_USERS")
+            return
+        
+        self.application = (  # type: ignore[assignment]
+            Application.builder()
+            .token(Config.BOT_TOKEN)
+            .post_init(self._post_init)
+            .post_shutdown(self._post_shutdown)
+            .build()
+        )
+        # run_polling 收到 SIGINT/SIGTERM 时会调用 post_shutdown；atexit 兜底其他退出路径
+        atexit.register(self._flush_snapshots_sync)
+        
+        # 添加处理器
+        self.application.add_handler(CommandHandler("start", self.start))  # type: ignore[arg-type]
+        self.application.add_handler(CommandHandler("re", self.regenerate_image_with_last_prompt_task))  # type: ignore[arg-type]
+        self.application.add_handler(CommandHandler("help", self.help_command))  # type: ignore[arg-type]
+        self.application.add_handler(CallbackQueryHandler(self.handle_callback))  # type: ignore[arg-type]
+        self.application.add_handler(MessageHandler(filters.TEXT & ~filters.COMMAND, self.handle_text_prompt))  # type: ignore[arg-type]
+        
+        logger.info("Stable Diffusion 控制机器人启动中...")
+        logger.info(f"SD WebUI API: {Config.SD_API_URL}")
         self.application.run_polling()  # type: ignore[attr-defined]
\ No newline at end of file
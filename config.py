@@ -1,84 +1,133 @@
-# config.py
-import os
-from dotenv import load_dotenv
-from typing import TypedDict, Optional
-
-load_dotenv()
-
-class UserSettings(TypedDict):
-    width: int
-    height: int
-    steps: int
-    cfg_scale: float
-    sampler_name: str
-    negative_prompt: str
-
-class FormData(TypedDict):
-    prompt: Optional[str]
-    resolution: Optional[str]  # 格式如 "1024x1024"
-    seed: Optional[int]  # None 表示随机
-    hires_fix: bool
-
-class HiresDefaults(TypedDict):
-    hr_scale: float
-    hr_upscaler: str
-    denoising_strength: float
-    hr_second_pass_ratio: float  # 基于总 steps 的比例，最终会换算为 hr_second_pass_steps
-    hr_resize_x: int
-    hr_resize_y: int
-
-class Config:
-    # Telegram配置
-    BOT_TOKEN = os.getenv('BOT_TOKEN')
-    # 逗号分隔的用户ID列表，去空格并过滤空项
-    _AUTH_RAW = os.getenv("AUTHORIZED_USERS", "")
-    AUTHORIZED_USERS = [u.strip() for u in _AUTH_RAW.split(",") if u.strip()]
-    
-    # Stable Diffusion WebUI配置
-    SD_API_URL = os.getenv('SD_API_URL', 'http://127.0.0.1:7860')
-    SD_API_TIMEOUT = int(os.getenv('SD_API_TIMEOUT', '300'))  # 5分钟超时
-    
-    # 安全配置
-    MAX_PROMPT_LENGTH = 500
-    MAX_QUEUE_SIZE = 5  # 最大并发任务数
-    
-    # SD默认参数
-    SD_DEFAULT_PARAMS: UserSettings = {
-        'width': 1024,
-        'height': 1024,
-        'steps': 20,
-        'cfg_scale': 7.0,
-        'sampler_name': 'Euler a',
-        'negative_prompt': 'lowres, bad anatomy, bad hands, text, error, missing fingers, extra digit, fewer digits, cropped, worst quality, low quality, normal quality, jpeg artifacts, signature, watermark, username, blurry'
-    }
-    
-    # 表单默认数据
-    DEFAULT_FORM_DATA: FormData = {
-        'prompt': None,
-        'resolution': None,
-        'seed': None,
-        'hires_fix': False
-    }
-    
-    # 高清修复默认参数
-    HIRES_DEFAULTS: HiresDefaults = {
-        'hr_scale': 2.0,
-        'hr_upscaler': 'R-ESRGAN 4x+ Anime6B',
-        'denoising_strength': 0.1,
-        'hr_second_pass_ratio': 0.5,  # 二次步数 = steps * ratio
-        'hr_resize_x': 0,
-        'hr_resize_y': 0,
-    }
-    
-    # 数据与图片保存设置
-    DATA_DIR = os.getenv('DATA_DIR', 'data')
-    LOCAL_SAVE_PATH = os.getenv('LOCAL_SAVE_PATH', 'generated_images')
-
-    # 点赞可操作的最近图片数量上限
-    LIKABLE_MESSAGE_LIMIT = int(os.getenv('LIKABLE_MESSAGE_LIMIT', '10'))
-
-    # 连续重新生成的上限（当用户仅输入数字时触发）
-    REGENERATE_MAX_RUNS = int(os.getenv('REGENERATE_MAX_RUNS', '10'))
-
-    # 快照缓存上限（重启后仍可使用的最近生成参数数）
-    SNAPSHOT_CACHE_LIMIT = int(os.getenv('SNAPSHOT_CACHE_LIMIT', '10'))
\ No newline at end of file
+# config.py
+import logging
+import os
+from typing import Any, Dict, FrozenSet, TypedDict, Optional
+
+# 始终读取 .env 补齐未设置的项（已存在的环境变量优先）；纯环境变量部署可设 SKIP_DOTENV=true 跳过导入 dotenv
+if os.getenv('SKIP_DOTENV', 'false').lower() != 'true':
+    from dotenv import load_dotenv
+    load_dotenv(override=False)
+
+class UserSettings(TypedDict):
+    width: int
+    height: int
+    steps: int
+    cfg_scale: float
+    sampler_name: str
+    negative_prompt: str
+
+class FormData(TypedDict):
+    prompt: Optional[str]
+    resolution: Optional[str]  # 格式如 "1024x1024"
+    seed: Optional[int]  # None 表示随机
+    hires_fix: bool
+
+class HiresDefaults(TypedDict):
+    hr_scale: float
+    hr_upscaler: str
+    denoising_strength: float
+    hr_second_pass_ratio: float  # 基于总 steps 的比例，最终会换算为 hr_second_pass_steps
+    hr_resize_x: int
+    hr_resize_y: int
+
+def _parse_user_ids(raw: str) -> FrozenSet[int]:
+    """解析逗号分隔的用户ID列表；空项跳过，非数字项（如 @username、占位文字）提示后忽略"""
+    user_ids = set()
+    for token in raw.split(","):
+        token = token.strip()
+        if not token:
+            continue
+        try:
+            user_ids.add(int(token))
+        except ValueError:
+            logging.getLogger(__name__).warning("AUTHORIZED_USERS 中的无效用户ID已忽略: %r", token)
+    return frozenset(user_ids)
+
+class Config:
+    # Telegram配置
+    BOT_TOKEN = os.getenv('BOT_TOKEN')
+    # 逗号分隔的用户ID列表，转为 int 集合；用 frozenset 使鉴权查找为 O(1)
+    AUTHORIZED_USERS: FrozenSet[int] = _parse_user_ids(os.getenv("AUTHORIZED_USERS", ""))
+    
+    # Stable Diffusion WebUI配置
+    SD_API_URL = os.getenv('SD_API_URL', 'http://127.0.0.1:7860')
+    SD_API_TIMEOUT = int(os.getenv('SD_API_TIMEOUT', '300'))  # 5分钟超时
+    # 生成期间后台轮询进度的间隔（秒）
+    SD_PROGRESS_POLL_INTERVAL = float(os.getenv('SD_PROGRESS_POLL_INTERVAL', '0.5'))
+    # 进度停滞时轮询间隔逐步翻倍，最长不超过此值（秒）
+    SD_PROGRESS_POLL_MAX_INTERVAL = float(os.getenv('SD_PROGRESS_POLL_MAX_INTERVAL', '4'))
+    # 模型/采样器列表变化很少，在此时长（秒）内复用上次结果
+    SD_LIST_CACHE_TTL = float(os.getenv('SD_LIST_CACHE_TTL', '300'))
+    # 当前模型（options）可能在 WebUI 端被切换，缓存时间较短
+    SD_OPTIONS_CACHE_TTL = float(os.getenv('SD_OPTIONS_CACHE_TTL', '10'))
+    # API 健康检查成功后，在此时长（秒）内不再重复探测
+    SD_HEALTH_CACHE_TTL = float(os.getenv('SD_HEALTH_CACHE_TTL', '5'))
+    # 与 SD WebUI 之间的最大并发连接数
+    SD_CONN_LIMIT = int(os.getenv('SD_CONN_LIMIT', '16'))
+    # 查询类 GET（模型、采样器、options）遇到瞬时故障时的最多尝试次数
+    SD_GET_ATTEMPTS = int(os.getenv('SD_GET_ATTEMPTS', '3'))
+    # 同时提交给 WebUI 的 txt2img 请求数（单卡 WebUI 串行生成，多卡部署可调大）
+    SD_MAX_CONCURRENT_GEN = int(os.getenv('SD_MAX_CONCURRENT_GEN', '1'))
+    # 是否在发送前用 PIL 校验 API 返回的 PNG（默认跳过，直接转发原始字节）
+    SD_VALIDATE_PNG = os.getenv('SD_VALIDATE_PNG', 'false').lower() == 'true'
+    
+    # 安全配置
+    MAX_PROMPT_LENGTH = 500
+    MAX_QUEUE_SIZE = 5  # 最大并发任务数
+    
+    # SD默认参数
+    SD_DEFAULT_PARAMS: UserSettings = {
+        'width': 1024,
+        'height': 1024,
+        'steps': 20,
+        'cfg_scale': 7.0,
+        'sampler_name': 'Euler a',
+        'negative_prompt': 'lowres, bad anatomy, bad hands, text, error, missing fingers, extra digit, fewer digits, cropped, worst quality, low quality, normal quality, jpeg artifacts, signature, watermark, username, blurry'
+    }
+    
+    # 表单默认数据
+    DEFAULT_FORM_DATA: FormData = {
+        'prompt': None,
+        'resolution': None,
+        'seed': None,
+        'hires_fix': False
+    }
+    
+    # 高清修复默认参数
+    HIRES_DEFAULTS: HiresDefaults = {
+        'hr_scale': 2.0,
+        'hr_upscaler': 'R-ESRGAN 4x+ Anime6B',
+        'denoising_strength': 0.1,
+        'hr_second_pass_ratio': 0.5,  # 二次步数 = steps * ratio
+        'hr_resize_x': 0,
+        'hr_resize_y': 0,
+    }
+    # 启用高清修复时固定写入的 API 参数（hr_second_pass_steps 随步数计算，不在其中）
+    HIRES_OVERRIDE_TEMPLATE: Dict[str, Any] = {
+        'enable_hr': True,
+        'hr_scale': HIRES_DEFAULTS['hr_scale'],
+        'hr_upscaler': HIRES_DEFAULTS['hr_upscaler'],
+        # 避免 None 值导致 WebUI 后端比较报错
+        'denoising_strength': HIRES_DEFAULTS['denoising_strength'],
+        # 不使用像素尺寸重设时明确给 0
+        'hr_resize_x': HIRES_DEFAULTS['hr_resize_x'],
+        'hr_resize_y': HIRES_DEFAULTS['hr_resize_y'],
+    }
+    
+    # 数据与图片保存设置
+    DATA_DIR = os.getenv('DATA_DIR', 'data')
+    LOCAL_SAVE_PATH = os.getenv('LOCAL_SAVE_PATH', 'generated_images')
+
+    # 点赞可操作的最近图片数量上限
+    LIKABLE_MESSAGE_LIMIT = int(os.getenv('LIKABLE_MESSAGE_LIMIT', '10'))
+
+    # 连续重新生成的上限（当用户仅输入数字时触发）
+    REGENERATE_MAX_RUNS = int(os.getenv('REGENERATE_MAX_RUNS', '10'))
+
+    # 快照缓存上限（重启后仍可使用的最近生成参数数）
+    SNAPSHOT_CACHE_LIMIT = int(os.getenv('SNAPSHOT_CACHE_LIMIT', '10'))
+    # 快照缓存落盘间隔（秒），期间的多次生成合并为一次写入
+    SNAPSHOT_FLUSH_INTERVAL = float(os.getenv('SNAPSHOT_FLUSH_INTERVAL', '5'))
+
+    # 内存中保留的任务结果数上限（点赞保存/高清化使用），超出后淘汰最旧的
+    TASK_CACHE_LIMIT = int(os.getenv('TASK_CACHE_LIMIT', str(SNAPSHOT_CACHE_LIMIT * 4)))
\ No newline at end of file
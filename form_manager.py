@@ -1,126 +1,139 @@
-from typing import Dict, Optional, Union, List, Any, Tuple
-from config import FormData, Config, UserSettings
-import random
-
-class FormManager:
-    """管理用户表单数据"""
-    
-    def __init__(self):
-        self.user_forms: Dict[str, FormData] = {}
-        self.form_input_states: Dict[str, str] = {}  # 跟踪用户当前的输入状态
-    
-    def get_user_form(self, user_id: str) -> FormData:
-        """获取用户的表单数据"""
-        if user_id not in self.user_forms:
-            self.user_forms[user_id] = Config.DEFAULT_FORM_DATA.copy()
-        return self.user_forms[user_id]
-    
-    def reset_user_form(self, user_id: str) -> None:
-        """重置用户表单"""
-        self.user_forms[user_id] = Config.DEFAULT_FORM_DATA.copy()
-        self.clear_input_state(user_id)
-    
-    def update_form_field(self, user_id: str, field: str, value: Union[str, int, bool, None]) -> None:
-        """更新表单字段"""
-        form_data = self.get_user_form(user_id)
-        form_data[field] = value
-    
-    def set_input_state(self, user_id: str, state: str) -> None:
-        """设置用户的输入状态"""
-        self.form_input_states[user_id] = state
-    
-    def get_input_state(self, user_id: str) -> Optional[str]:
-        """获取用户的输入状态"""
-        return self.form_input_states.get(user_id)
-    
-    def clear_input_state(self, user_id: str) -> None:
-        """清除用户的输入状态"""
-        if user_id in self.form_input_states:
-            del self.form_input_states[user_id]
-    
-    def is_waiting_for_input(self, user_id: str) -> bool:
-        """检查用户是否在等待输入"""
-        return user_id in self.form_input_states
-    
-    def format_form_summary(self, user_id: str) -> Dict[str, str]:
-        """格式化表单摘要显示"""
-        form_data = self.get_user_form(user_id)
-        
-        prompt_display = form_data.get('prompt') or "未设置 (将使用随机)"
-        if prompt_display != "未设置 (将使用随机)" and len(prompt_display) > 30:
-            prompt_display = prompt_display[:30] + "..."
-            
-        resolution_display = form_data.get('resolution') or "未设置 (使用默认)"
-        seed_display = str(form_data.get('seed')) if form_data.get('seed') is not None else "自动随机"
-        hires_display = "开启" if form_data.get('hires_fix') else "关闭"
-        
-        return {
-            'prompt': prompt_display,
-            'resolution': resolution_display, 
-            'seed': seed_display,
-            'hires_fix': hires_display
-        }
-    
-    def validate_seed(self, seed_text: str) -> Tuple[bool, Optional[int], str]:
-        """验证种子输入"""
-        seed_text = seed_text.strip().lower()
-        
-        if seed_text == 'skip':
-            return True, None, "已跳过"
-        elif seed_text == 'random':
-            return True, None, "随机"
-        else:
-            try:
-                seed = int(seed_text)
-                if 0 <= seed <= 4294967295:
-                    return True, seed, "有效"
-                else:
-                    return False, None, "种子超出范围 (0-4294967295)"
-            except ValueError:
-                return False, None, "无效格式"
-    
-    def generate_params_from_form(self, user_id: str, user_settings: UserSettings) -> Dict[str, Any]:
-        """从表单生成API参数"""
-        form_data = self.get_user_form(user_id)
-        params: Dict[str, Any] = dict(user_settings)
-        
-        # 处理分辨率
-        if form_data.get('resolution'):
-            try:
-                width, height = form_data['resolution'].split('x')
-                params['width'] = int(width)
-                params['height'] = int(height)
-            except ValueError:
-                pass  # 使用默认分辨率
-        
-        # 处理种子（如果用户指定了则使用，否则让bot.py统一处理）
-        if form_data.get('seed') is not None:
-            params['seed'] = form_data['seed']
-        
-        # 高清修复参数映射
-        if form_data.get('hires_fix'):
-            h = Config.HIRES_DEFAULTS
-            params['enable_hr'] = True
-            params['hr_scale'] = h['hr_scale']
-            params['hr_upscaler'] = h['hr_upscaler']
-            # 避免 None 值导致 WebUI 后端比较报错
-            params['denoising_strength'] = h['denoising_strength']
-            # 二次采样步数：基于比例计算，至少 1
-            total_steps = int(params.get('steps', 20) or 20)
-            params['hr_second_pass_steps'] = max(1, int(total_steps * h['hr_second_pass_ratio']))
-            # 不使用像素尺寸重设时明确给 0
-            params['hr_resize_x'] = h['hr_resize_x']
-            params['hr_resize_y'] = h['hr_resize_y']
-        
-        return params
-    
-    def get_prompt_from_form(self, user_id: str, random_prompts: List[str]) -> str:
-        """从表单获取提示词，如果未设置则使用随机提示词"""
-        form_data = self.get_user_form(user_id)
-        prompt = form_data.get('prompt')
-        
-        if not prompt or prompt.strip() == "":
-            # 使用随机提示词
-            return random.choice(random_prompts)
-        
+import functools
+from dataclasses import dataclass
+from typing import Dict, Optional, Union, List, Any, Tuple
+from config import FormData, Config, UserSettings
+import random
+
+@functools.lru_cache(maxsize=32)
+def _parse_res(resolution: str) -> Tuple[int, int]:
+    """解析 "宽x高" 分辨率字符串（取值来自固定菜单，缓存解析结果）"""
+    width, height = resolution.split('x')
+    return int(width), int(height)
+
+@dataclass(slots=True)
+class UserFormState:
+    """单个用户的表单数据与当前输入状态"""
+    data: FormData
+    input_state: Optional[str] = None
+
+class FormManager:
+    """管理用户表单数据"""
+    
+    def __init__(self):
+        # 表单数据与输入状态合并存放，每次操作只需一次字典查找
+        self.users: Dict[int, UserFormState] = {}
+    
+    def _get_state(self, user_id: int) -> UserFormState:
+        """获取用户的表单状态，不存在时以默认表单创建"""
+        state = self.users.get(user_id)
+        if state is None:
+            state = self.users[user_id] = UserFormState(Config.DEFAULT_FORM_DATA.copy())
+        return state
+    
+    def get_user_form(self, user_id: int) -> FormData:
+        """获取用户的表单数据"""
+        return self._get_state(user_id).data
+    
+    def reset_user_form(self, user_id: int) -> None:
+        """重置用户表单"""
+        self.users[user_id] = UserFormState(Config.DEFAULT_FORM_DATA.copy())
+    
+    def update_form_field(self, user_id: int, field: str, value: Union[str, int, bool, None]) -> None:
+        """更新表单字段"""
+        form_data = self.get_user_form(user_id)
+        form_data[field] = value
+    
+    def set_input_state(self, user_id: int, state: str) -> None:
+        """设置用户的输入状态"""
+        self._get_state(user_id).input_state = state
+    
+    def get_input_state(self, user_id: int) -> Optional[str]:
+        """获取用户的输入状态"""
+        state = self.users.get(user_id)
+        return state.input_state if state is not None else None
+    
+    def clear_input_state(self, user_id: int) -> None:
+        """清除用户的输入状态"""
+        state = self.users.get(user_id)
+        if state is not None:
+            state.input_state = None
+    
+    def is_waiting_for_input(self, user_id: int) -> bool:
+        """检查用户是否在等待输入"""
+        return self.get_input_state(user_id) is not None
+    
+    def format_form_summary(self, user_id: int) -> Dict[str, str]:
+        """格式化表单摘要显示"""
+        form_data = self.get_user_form(user_id)
+        
+        prompt_display = form_data.get('prompt') or "未设置 (将使用随机)"
+        if prompt_display != "未设置 (将使用随机)" and len(prompt_display) > 30:
+            prompt_display = prompt_display[:30] + "..."
+            
+        resolution_display = form_data.get('resolution') or "未设置 (使用默认)"
+        seed_display = str(form_data.get('seed')) if form_data.get('seed') is not None else "自动随机"
+        hires_display = "开启" if form_data.get('hires_fix') else "关闭"
+        
+        return {
+            'prompt': prompt_display,
+            'resolution': resolution_display, 
+            'seed': seed_display,
+            'hires_fix': hires_display
+        }
+    
+    def validate_seed(self, seed_text: str) -> Tuple[bool, Optional[int], str]:
+        """验证种子输入"""
+        seed_text = seed_text.strip().lower()
+        
+        if seed_text == 'skip':
+            return True, None, "已跳过"
+        elif seed_text == 'random':
+            return True, None, "随机"
+        else:
+            try:
+                seed = int(seed_text)
+                if 0 <= seed <= 4294967295:
+                    return True, seed, "有效"
+                else:
+                    return False, None, "种子超出范围 (0-4294967295)"
+            except ValueError:
+                return False, None, "无效格式"
+    
+    def generate_params_from_form(self, user_id: int, user_settings: UserSettings) -> Dict[str, Any]:
+        """从表单生成API参数"""
+        form_data = self.get_user_form(user_id)
+        params: Dict[str, Any] = dict(user_settings)
+        # 覆盖项先收集到局部字典，最后一次性 update
+        overrides: Dict[str, Any] = {}
+        
+        # 处理分辨率
+        if form_data.get('resolution'):
+            try:
+                overrides['width'], overrides['height'] = _parse_res(form_data['resolution'])
+            except ValueError:
+                pass  # 使用默认分辨率
+        
+        # 处理种子（如果用户指定了则使用，否则让bot.py统一处理）
+        if form_data.get('seed') is not None:
+            overrides['seed'] = form_data['seed']
+        
+        # 高清修复参数映射
+        if form_data.get('hires_fix'):
+            overrides.update(Config.HIRES_OVERRIDE_TEMPLATE)
+            # 二次采样步数：基于比例计算，至少 1
+            total_steps = int(params.get('steps', 20) or 20)
+            overrides['hr_second_pass_steps'] = max(1, int(total_steps * Config.HIRES_DEFAULTS['hr_second_pass_ratio']))
+        
+        params.update(overrides)
+        return params
+    
+    def get_prompt_from_form(self, user_id: int, random_prompts: List[str]) -> str:
+        """从表单获取提示词，如果未设置则使用随机提示词"""
+        form_data = self.get_user_form(user_id)
+        prompt = form_data.get('prompt')
+        
+        if not prompt or prompt.strip() == "":
+            # 使用随机提示词
+            return random.choice(random_prompts)
+        
         return prompt.strip()
\ No newline at end of file
@@ -1,175 +1,238 @@
-from enum import Enum
-from telegram import InlineKeyboardButton, InlineKeyboardMarkup
-
-class CallbackData(Enum):
-    TXT2IMG = "txt2img"
-    SD_STATUS = "sd_status"
-    SD_SETTINGS = "sd_settings"
-    RESOLUTION_SETTINGS = "resolution_settings"
-    NEGATIVE_PROMPT_SETTINGS = "negative_prompt_settings"
-    GENERATION_HISTORY = "generation_history"
-    INPUT_PROMPT = "input_prompt"
-    RANDOM_GENERATE = "random_generate"
-    MAIN_MENU = "main_menu"
-    INTERRUPT = "interrupt_{task_id}"
-    LIKE = "like_{task_id}"
-    ENHANCE_HR = "enhance_hr_{task_id}"
-    SET_RESOLUTION = "set_resolution_{res}"
-    SET_NEGATIVE_PROMPT = "set_negative_prompt"
-    RESET_NEGATIVE_PROMPT = "reset_negative_prompt"
-    CANCEL_NEGATIVE_PROMPT = "cancel_negative_prompt"
-    # 新增表单相关回调
-    ADVANCED_FORM = "advanced_form"
-    FORM_SET_PROMPT = "form_set_prompt"
-    FORM_SET_RESOLUTION = "form_set_resolution_{res}"
-    FORM_SET_SEED = "form_set_seed"
-    FORM_TOGGLE_HIRES = "form_toggle_hires"
-    FORM_GENERATE = "form_generate"
-    FORM_RESET = "form_reset"
-    FORM_CANCEL_INPUT = "form_cancel_input"
-    FORM_SET_RESOLUTION_MENU = "form_set_resolution_menu"
-
-    @staticmethod
-    def interrupt(task_id: str) -> str:
-        return CallbackData.INTERRUPT.value.format(task_id=task_id)
-
-    @staticmethod
-    def like(task_id: str) -> str:
-        return CallbackData.LIKE.value.format(task_id=task_id)
-
-    @staticmethod
-    def enhance_hr(task_id: str) -> str:
-        return CallbackData.ENHANCE_HR.value.format(task_id=task_id)
-
-    @staticmethod
-    def set_resolution(res: str) -> str:
-        return CallbackData.SET_RESOLUTION.value.format(res=res.replace('x', '_'))
-
-    @staticmethod
-    def form_set_resolution(res: str) -> str:
-        return CallbackData.FORM_SET_RESOLUTION.value.format(res=res.replace('x', '_'))
-
-from typing import Dict
-
-class Keyboards:
-    @staticmethod
-    def main_menu() -> InlineKeyboardMarkup:
-        return InlineKeyboardMarkup([
-            [InlineKeyboardButton("🎨 生成图片", callback_data=CallbackData.TXT2IMG.value)],
-            [InlineKeyboardButton("📊 SD状态", callback_data=CallbackData.SD_STATUS.value)],
-            [InlineKeyboardButton("🛠️ SD设置", callback_data=CallbackData.SD_SETTINGS.value)],
-            [InlineKeyboardButton("📈 生成历史", callback_data=CallbackData.GENERATION_HISTORY.value)],
-        ])
-
-    @staticmethod
-    def generation_menu() -> InlineKeyboardMarkup:
-        return InlineKeyboardMarkup([
-            [InlineKeyboardButton("✏️ 输入提示词", callback_data=CallbackData.INPUT_PROMPT.value)],
-            [InlineKeyboardButton("🎲 随机生成", callback_data=CallbackData.RANDOM_GENERATE.value)],
-            [InlineKeyboardButton("📝 高级表单", callback_data=CallbackData.ADVANCED_FORM.value)],
-            [InlineKeyboardButton("🔙 返回主菜单", callback_data=CallbackData.MAIN_MENU.value)],
-        ])
-
-    @staticmethod
-    def resolution_menu(current_res: str) -> InlineKeyboardMarkup:
-        resolutions = [
-            ("1024x1024", "正方形"),
-            ("1216x832", "横屏"),
-            ("832x1216", "竖屏"),
-            ("1280x720", "宽屏 16:9"),
-            ("720x1280", "竖屏 9:16")
-        ]
-        keyboard: list[list[InlineKeyboardButton]] = []
-        for res_text, desc in resolutions:
-            prefix = "✅ " if res_text == current_res else ""
-            button_text = f"{prefix}{res_text} ({desc})"
-            callback_data = CallbackData.set_resolution(res_text)
-            keyboard.append([InlineKeyboardButton(button_text, callback_data=callback_data)])
-        keyboard.append([InlineKeyboardButton("🔙 返回主菜单", callback_data=CallbackData.MAIN_MENU.value)])
-        return InlineKeyboardMarkup(keyboard)
-    
-    @staticmethod
-    def sd_setting_menu() -> InlineKeyboardMarkup:
-        return InlineKeyboardMarkup([
-            [InlineKeyboardButton("📐 分辨率设置", callback_data=CallbackData.RESOLUTION_SETTINGS.value)],
-            [InlineKeyboardButton("🚫 负面词设置", callback_data=CallbackData.NEGATIVE_PROMPT_SETTINGS.value)],
-            [InlineKeyboardButton("🔙 返回主菜单", callback_data=CallbackData.MAIN_MENU.value)],
-        ])
-
-    @staticmethod
-    def negative_prompt_menu() -> InlineKeyboardMarkup:
-        return InlineKeyboardMarkup([
-            [InlineKeyboardButton("✏️ 自定义负面词", callback_data=CallbackData.SET_NEGATIVE_PROMPT.value)],
-            [InlineKeyboardButton("🔄 恢复默认", callback_data=CallbackData.RESET_NEGATIVE_PROMPT.value)],
-            [InlineKeyboardButton("🔙 返回主菜单", callback_data=CallbackData.MAIN_MENU.value)],
-        ])
-
-    @staticmethod
-    def negative_prompt_input_menu() -> InlineKeyboardMarkup:
-        """输入负面词时显示的键盘，包含取消按钮"""
-        return InlineKeyboardMarkup([
-            [InlineKeyboardButton("❌ 取消输入", callback_data=CallbackData.CANCEL_NEGATIVE_PROMPT.value)],
-        ])
-
-    @staticmethod
-    def interrupt_keyboard(task_id: str) -> InlineKeyboardMarkup:
-        return InlineKeyboardMarkup([
-            [InlineKeyboardButton("⏹️ 中断生成", callback_data=CallbackData.interrupt(task_id))]
-        ])
-
-    @staticmethod
-    def like_keyboard(task_id: str, show_enhance: bool = True) -> InlineKeyboardMarkup:
-        row = [InlineKeyboardButton("👍 点赞并保存", callback_data=CallbackData.like(task_id))]
-        if show_enhance:
-            row.append(InlineKeyboardButton("✨ 高清化", callback_data=CallbackData.enhance_hr(task_id)))
-        return InlineKeyboardMarkup([row])
-
-    # 新增表单相关键盘
-    @staticmethod
-    def advanced_form_menu(form_data: Dict[str, object]) -> InlineKeyboardMarkup:
-        """高级表单菜单"""
-        prompt_text = f"✏️ 正面词: {'已设置' if form_data.get('prompt') else '未设置'}"
-        resolution_text = f"📐 分辨率: {form_data.get('resolution', '未设置')}"
-        seed_text = f"🎲 种子: {form_data.get('seed', '随机')}"
-        hires_text = f"🔍 高清修复: {'✅ 开启' if form_data.get('hires_fix') else '❌ 关闭'}"
-        
-        keyboard = [
-            [InlineKeyboardButton(prompt_text, callback_data=CallbackData.FORM_SET_PROMPT.value)],
-            [InlineKeyboardButton(resolution_text, callback_data=CallbackData.FORM_SET_RESOLUTION_MENU.value)],
-            [InlineKeyboardButton(seed_text, callback_data=CallbackData.FORM_SET_SEED.value)],
-            [InlineKeyboardButton(hires_text, callback_data=CallbackData.FORM_TOGGLE_HIRES.value)],
-            [InlineKeyboardButton("🚀 生成图片", callback_data=CallbackData.FORM_GENERATE.value)],
-            [
-                InlineKeyboardButton("🔄 重置表单", callback_data=CallbackData.FORM_RESET.value),
-                InlineKeyboardButton("🔙 返回", callback_data=CallbackData.TXT2IMG.value)
-            ]
-        ]
-        return InlineKeyboardMarkup(keyboard)
-
-    @staticmethod
-    def form_resolution_menu(current_res: str) -> InlineKeyboardMarkup:
-        """表单中的分辨率选择菜单"""
-        resolutions = [
-            ("1024x1024", "正方形"),
-            ("1216x832", "横屏"),
-            ("832x1216", "竖屏"),
-            ("1280x720", "宽屏 16:9"),
-            ("720x1280", "竖屏 9:16"),
-            ("512x512", "小尺寸"),
-            ("768x768", "中等尺寸")
-        ]
-        keyboard: list[list[InlineKeyboardButton]] = []
-        for res_text, desc in resolutions:
-            prefix = "✅ " if res_text == current_res else ""
-            button_text = f"{prefix}{res_text} ({desc})"
-            callback_data = CallbackData.form_set_resolution(res_text)
-            keyboard.append([InlineKeyboardButton(button_text, callback_data=callback_data)])
-        keyboard.append([InlineKeyboardButton("🔙 返回表单", callback_data=CallbackData.ADVANCED_FORM.value)])
-        return InlineKeyboardMarkup(keyboard)
-
-    @staticmethod
-    def form_input_cancel_menu() -> InlineKeyboardMarkup:
-        """表单输入时的取消菜单"""
-        return InlineKeyboardMarkup([
-            [InlineKeyboardButton("❌ 取消输入", callback_data=CallbackData.FORM_CANCEL_INPUT.value)],
-        ])
\ No newline at end of file
+import functools
+import re
+import sys
+from typing import Dict, Final, Tuple
+from telegram import InlineKeyboardButton, InlineKeyboardMarkup
+
+class CallbackData:
+    """回调数据常量"""
+    __slots__ = ()
+
+    TXT2IMG = "txt2img"
+    SD_STATUS = "sd_status"
+    SD_SETTINGS = "sd_settings"
+    RESOLUTION_SETTINGS = "resolution_settings"
+    NEGATIVE_PROMPT_SETTINGS = "negative_prompt_settings"
+    GENERATION_HISTORY = "generation_history"
+    INPUT_PROMPT = "input_prompt"
+    RANDOM_GENERATE = "random_generate"
+    MAIN_MENU = "main_menu"
+    INTERRUPT = "interrupt_{task_id}"
+    LIKE = "like_{task_id}"
+    ENHANCE_HR = "enhance_hr_{task_id}"
+    SET_RESOLUTION = "set_resolution_{res}"
+    SET_NEGATIVE_PROMPT = "set_negative_prompt"
+    RESET_NEGATIVE_PROMPT = "reset_negative_prompt"
+    CANCEL_NEGATIVE_PROMPT = "cancel_negative_prompt"
+    # 新增表单相关回调
+    ADVANCED_FORM = "advanced_form"
+    FORM_SET_PROMPT = "form_set_prompt"
+    FORM_SET_RESOLUTION = "form_set_resolution_{res}"
+    FORM_SET_SEED = "form_set_seed"
+    FORM_TOGGLE_HIRES = "form_toggle_hires"
+    FORM_GENERATE = "form_generate"
+    FORM_RESET = "form_reset"
+    FORM_CANCEL_INPUT = "form_cancel_input"
+    FORM_SET_RESOLUTION_MENU = "form_set_resolution_menu"
+
+    # 与 INTERRUPT/LIKE/ENHANCE_HR 模板一致，用 f-string 拼接比 str.format 更快
+    @staticmethod
+    def interrupt(task_id: str) -> str:
+        return f"interrupt_{task_id}"
+
+    @staticmethod
+    def like(task_id: str) -> str:
+        return f"like_{task_id}"
+
+    @staticmethod
+    def enhance_hr(task_id: str) -> str:
+        return f"enhance_hr_{task_id}"
+
+    # 菜单内的分辨率直接查预生成的表，其它取值才现场格式化
+    @staticmethod
+    def set_resolution(res: str) -> str:
+        return _SET_RES_CB.get(res) or CallbackData.SET_RESOLUTION.format(res=res.replace('x', '_'))
+
+    @staticmethod
+    def form_set_resolution(res: str) -> str:
+        return _FORM_SET_RES_CB.get(res) or CallbackData.FORM_SET_RESOLUTION.format(res=res.replace('x', '_'))
+
+# 带参数回调的 (前缀, 名称)，前缀取自上面的模板
+CALLBACK_PREFIXES: Final[Tuple[Tuple[str, str], ...]] = tuple(
+    (template.split("{", 1)[0], name) for name, template in (
+        ("interrupt", CallbackData.INTERRUPT),
+        ("like", CallbackData.LIKE),
+        ("enhance_hr", CallbackData.ENHANCE_HR),
+        ("set_resolution", CallbackData.SET_RESOLUTION),
+        ("form_set_resolution", CallbackData.FORM_SET_RESOLUTION),
+    )
+)
+# 一次匹配得到 (前缀, 参数)；form_set_resolution_menu 是固定回调，需排除
+PREFIX_RE: Final[re.Pattern[str]] = re.compile(
+    rf"^(?!{re.escape(CallbackData.FORM_SET_RESOLUTION_MENU)}$)"
+    rf"({'|'.join(re.escape(prefix) for prefix, _ in CALLBACK_PREFIXES)})(.+)$"
+)
+
+# 按任务变化的键盘只替换回调数据，按钮文字固定
+_INTERRUPT_TEXT = "⏹️ 中断生成"
+_LIKE_TEXT = "👍 点赞并保存"
+_ENHANCE_HR_TEXT = "✨ 高清化"
+
+# 分辨率菜单的可选项 (分辨率, 描述)
+_RESOLUTIONS: Final[Tuple[Tuple[str, str], ...]] = (
+    ("1024x1024", "正方形"),
+    ("1216x832", "横屏"),
+    ("832x1216", "竖屏"),
+    ("1280x720", "宽屏 16:9"),
+    ("720x1280", "竖屏 9:16"),
+)
+# 表单中额外提供小尺寸选项
+_FORM_RESOLUTIONS: Final[Tuple[Tuple[str, str], ...]] = _RESOLUTIONS + (
+    ("512x512", "小尺寸"),
+    ("768x768", "中等尺寸"),
+)
+
+# 分辨率固定，回调数据在导入时一次性生成并驻留（运行时拼接的字符串不会被自动驻留）
+_SET_RES_CB = {res: sys.intern(f"set_resolution_{res.replace('x', '_')}") for res, _ in _FORM_RESOLUTIONS}
+_FORM_SET_RES_CB = {res: sys.intern(f"form_set_resolution_{res.replace('x', '_')}") for res, _ in _FORM_RESOLUTIONS}
+
+# 分辨率按钮文字：未选中与选中（带 ✅）两种，导入时预先生成
+_RES_LABEL_PLAIN = {res: f"{res} ({desc})" for res, desc in _FORM_RESOLUTIONS}
+_RES_LABEL_SEL = {res: f"✅ {res} ({desc})" for res, desc in _FORM_RESOLUTIONS}
+
+# 多个菜单共用的按钮，只创建一次
+_BACK_TO_MAIN = InlineKeyboardButton("🔙 返回主菜单", callback_data=CallbackData.MAIN_MENU)
+_BACK_TO_FORM = InlineKeyboardButton("🔙 返回表单", callback_data=CallbackData.ADVANCED_FORM)
+_CANCEL_NEG = InlineKeyboardButton("❌ 取消输入", callback_data=CallbackData.CANCEL_NEGATIVE_PROMPT)
+_CANCEL_FORM_INPUT = InlineKeyboardButton("❌ 取消输入", callback_data=CallbackData.FORM_CANCEL_INPUT)
+
+# 不含动态内容的键盘只构建一次（InlineKeyboardMarkup 创建后不可变，可安全复用）
+class Keyboards:
+    @staticmethod
+    @functools.lru_cache(maxsize=None)
+    def main_menu() -> InlineKeyboardMarkup:
+        return InlineKeyboardMarkup((
+            (InlineKeyboardButton("🎨 生成图片", callback_data=CallbackData.TXT2IMG),),
+            (InlineKeyboardButton("📊 SD状态", callback_data=CallbackData.SD_STATUS),),
+            (InlineKeyboardButton("🛠️ SD设置", callback_data=CallbackData.SD_SETTINGS),),
+            (InlineKeyboardButton("📈 生成历史", callback_data=CallbackData.GENERATION_HISTORY),),
+        ))
+
+    @staticmethod
+    @functools.lru_cache(maxsize=None)
+    def generation_menu() -> InlineKeyboardMarkup:
+        return InlineKeyboardMarkup((
+            (InlineKeyboardButton("✏️ 输入提示词", callback_data=CallbackData.INPUT_PROMPT),),
+            (InlineKeyboardButton("🎲 随机生成", callback_data=CallbackData.RANDOM_GENERATE),),
+            (InlineKeyboardButton("📝 高级表单", callback_data=CallbackData.ADVANCED_FORM),),
+            (_BACK_TO_MAIN,),
+        ))
+
+    @staticmethod
+    @functools.lru_cache(maxsize=32)
+    def resolution_menu(current_res: str) -> InlineKeyboardMarkup:
+        keyboard: list[list[InlineKeyboardButton]] = [
+            [InlineKeyboardButton(
+                _RES_LABEL_SEL[res_text] if res_text == current_res else _RES_LABEL_PLAIN[res_text],
+                callback_data=_SET_RES_CB[res_text],
+            )]
+            for res_text, _ in _RESOLUTIONS
+        ]
+        keyboard.append([_BACK_TO_MAIN])
+        return InlineKeyboardMarkup(keyboard)
+    
+    @staticmethod
+    @functools.lru_cache(maxsize=None)
+    def sd_setting_menu() -> InlineKeyboardMarkup:
+        return InlineKeyboardMarkup((
+            (InlineKeyboardButton("📐 分辨率设置", callback_data=CallbackData.RESOLUTION_SETTINGS),),
+            (InlineKeyboardButton("🚫 负面词设置", callback_data=CallbackData.NEGATIVE_PROMPT_SETTINGS),),
+            (_BACK_TO_MAIN,),
+        ))
+
+    @staticmethod
+    @functools.lru_cache(maxsize=None)
+    def negative_prompt_menu() -> InlineKeyboardMarkup:
+        return InlineKeyboardMarkup((
+            (InlineKeyboardButton("✏️ 自定义负面词", callback_data=CallbackData.SET_NEGATIVE_PROMPT),),
+            (InlineKeyboardButton("🔄 恢复默认", callback_data=CallbackData.RESET_NEGATIVE_PROMPT),),
+            (_BACK_TO_MAIN,),
+        ))
+
+    @staticmethod
+    @functools.lru_cache(maxsize=None)
+    def negative_prompt_input_menu() -> InlineKeyboardMarkup:
+        """输入负面词时显示的键盘，包含取消按钮"""
+        return InlineKeyboardMarkup((
+            (_CANCEL_NEG,),
+        ))
+
+    # task_id 每次生成都不同，缓存不会命中，直接构建
+    @staticmethod
+    def interrupt_keyboard(task_id: str) -> InlineKeyboardMarkup:
+        return InlineKeyboardMarkup([
+            [InlineKeyboardButton(_INTERRUPT_TEXT, callback_data=CallbackData.interrupt(task_id))]
+        ])
+
+    @staticmethod
+    def like_keyboard(task_id: str, show_enhance: bool = True) -> InlineKeyboardMarkup:
+        row = [InlineKeyboardButton(_LIKE_TEXT, callback_data=CallbackData.like(task_id))]
+        if show_enhance:
+            row.append(InlineKeyboardButton(_ENHANCE_HR_TEXT, callback_data=CallbackData.enhance_hr(task_id)))
+        return InlineKeyboardMarkup([row])
+
+    # 新增表单相关键盘
+    @staticmethod
+    def advanced_form_menu(form_data: Dict[str, object]) -> InlineKeyboardMarkup:
+        """高级表单菜单"""
+        return Keyboards._build_advanced_form_menu(
+            bool(form_data.get('prompt')),
+            form_data.get('resolution', '未设置'),
+            form_data.get('seed', '随机'),
+            bool(form_data.get('hires_fix')),
+        )
+
+    @staticmethod
+    @functools.lru_cache(maxsize=64)
+    def _build_advanced_form_menu(prompt_set: bool, resolution: object,
+                                  seed: object, hires_on: bool) -> InlineKeyboardMarkup:
+        """按表单中影响显示的字段缓存高级表单菜单"""
+        prompt_text = f"✏️ 正面词: {'已设置' if prompt_set else '未设置'}"
+        resolution_text = f"📐 分辨率: {resolution}"
+        seed_text = f"🎲 种子: {seed}"
+        hires_text = f"🔍 高清修复: {'✅ 开启' if hires_on else '❌ 关闭'}"
+        
+        keyboard = [
+            [InlineKeyboardButton(prompt_text, callback_data=CallbackData.FORM_SET_PROMPT)],
+            [InlineKeyboardButton(resolution_text, callback_data=CallbackData.FORM_SET_RESOLUTION_MENU)],
+            [InlineKeyboardButton(seed_text, callback_data=CallbackData.FORM_SET_SEED)],
+            [InlineKeyboardButton(hires_text, callback_data=CallbackData.FORM_TOGGLE_HIRES)],
+            [InlineKeyboardButton("🚀 生成图片", callback_data=CallbackData.FORM_GENERATE)],
+            [
+                InlineKeyboardButton("🔄 重置表单", callback_data=CallbackData.FORM_RESET),
+                InlineKeyboardButton("🔙 返回", callback_data=CallbackData.TXT2IMG)
+            ]
+        ]
+        return InlineKeyboardMarkup(keyboard)
+
+    @staticmethod
+    @functools.lru_cache(maxsize=32)
+    def form_resolution_menu(current_res: str) -> InlineKeyboardMarkup:
+        """表单中的分辨率选择菜单"""
+        keyboard: list[list[InlineKeyboardButton]] = [
+            [InlineKeyboardButton(
+                _RES_LABEL_SEL[res_text] if res_text == current_res else _RES_LABEL_PLAIN[res_text],
+                callback_data=_FORM_SET_RES_CB[res_text],
+            )]
+            for res_text, _ in _FORM_RESOLUTIONS
+        ]
+        keyboard.append([_BACK_TO_FORM])
+        return InlineKeyboardMarkup(keyboard)
+
+    @staticmethod
+    @functools.lru_cache(maxsize=None)
+    def form_input_cancel_menu() -> InlineKeyboardMarkup:
+        """表单输入时的取消菜单"""
+        return InlineKeyboardMarkup((
+            (_CANCEL_FORM_INPUT,),
+        ))
\ No newline at end of file
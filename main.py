@@ -1,11 +1,18 @@
 # main.py
-from datetime import datetime
-from bot import TelegramBot
+import sys
 
 if __name__ == "__main__":
-    print("🎨 Stable Diffusion Telegram 控制器")
-    print(f"⏰ 启动时间: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
-    print("=" * 50)
+    # 仅在直接运行时导入，被工具导入本模块时不加载 PTB 等重依赖
+    from datetime import datetime
+    from bot import TelegramBot
+
+    # 启动横幅一次写出，避免与库的启动日志交错
+    sys.stdout.write(
+        "🎨 Stable Diffusion Telegram 控制器\n"
+        f"⏰ 启动时间: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}\n"
+        f"{'=' * 50}\n"
+    )
+    sys.stdout.flush()
     
     bot = TelegramBot()
     
@@ -1,218 +1,460 @@
-import aiohttp
-import asyncio
-import base64
-import io
-import os
-from datetime import datetime
-from typing import Optional, Any, Dict, List, Tuple, Union
-from PIL import Image
-from config import Config
-from PIL.PngImagePlugin import PngInfo
-import json
-
-class StableDiffusionController:
-    api_url: str
-    timeout: int
-    last_result: Optional[Dict[str, Any]]
-
-    def __init__(self) -> None:
-        self.api_url = Config.SD_API_URL
-        self.timeout = Config.SD_API_TIMEOUT
-        self.last_result = None
-
-    async def check_api_status(self) -> bool:
-        """检查SD WebUI API是否可用"""
-        try:
-            async with aiohttp.ClientSession() as session:
-                async with session.get(f"{self.api_url}/sdapi/v1/options", timeout=10) as response:
-                    print(f"SD API状态检查: {response.status}")  # 调试信息
-                    return response.status == 200
-        except aiohttp.ClientConnectorError as e:
-            print(f"SD API连接错误: {e}")  # 调试信息
-            return False
-        except asyncio.TimeoutError:
-            print("SD API连接超时")  # 调试信息
-            return False
-        except Exception as e:
-            print(f"SD API未知错误: {e}")  # 调试信息
-            return False
-
-    async def get_models(self) -> List[str]:
-        """获取可用模型列表"""
-        try:
-            async with aiohttp.ClientSession() as session:
-                async with session.get(f"{self.api_url}/sdapi/v1/sd-models", timeout=10) as response:
-                    if response.status == 200:
-                        models = await response.json()
-                        return [model['title'] for model in models]
-                    return []
-        except Exception:
-            return []
-
-    async def get_current_model(self) -> str:
-        """获取当前使用的模型"""
-        try:
-            async with aiohttp.ClientSession() as session:
-                async with session.get(f"{self.api_url}/sdapi/v1/options", timeout=10) as response:
-                    if response.status == 200:
-                        options = await response.json()
-                        current_model = options.get('sd_model_checkpoint', '未知')
-                        if '\\' in current_model or '/' in current_model:
-                            current_model = current_model.split('\\')[-1].split('/')[-1]
-                        if current_model.endswith('.safetensors') or current_model.endswith('.ckpt'):
-                            current_model = current_model.rsplit('.', 1)[0]
-                        return current_model
-                    return "获取失败"
-        except Exception as e:
-            print(f"获取当前模型失败: {e}")
-            return "未知"
-
-    async def get_samplers(self) -> List[str]:
-        """获取可用采样器列表"""
-        try:
-            async with aiohttp.ClientSession() as session:
-                async with session.get(f"{self.api_url}/sdapi/v1/samplers", timeout=10) as response:
-                    if response.status == 200:
-                        samplers = await response.json()
-                        return [sampler['name'] for sampler in samplers]
-                    return []
-        except Exception:
-            return []
-
-    async def generate_image(
-        self,
-        prompt: str,
-        negative_prompt: Optional[str] = None,
-        **params: Any
-    ) -> Tuple[bool, Union[Tuple[io.BytesIO, Dict[str, Any]], str]]:
-        """生成图片"""
-        generation_params: Dict[str, Any] = Config.SD_DEFAULT_PARAMS.copy()
-        generation_params.update(params)
-        generation_params['prompt'] = prompt
-        if negative_prompt:
-            generation_params['negative_prompt'] = negative_prompt
-
-        try:
-            async with aiohttp.ClientSession() as session:
-                async with session.post(
-                    f"{self.api_url}/sdapi/v1/txt2img",
-                    json=generation_params,
-                    timeout=self.timeout
-                ) as response:
-                    if response.status == 200:
-                        result = await response.json()
-                        if result.get('images'):
-                            image_data = base64.b64decode(result['images'][0])
-                            image = Image.open(io.BytesIO(image_data))
-                            img_bytes = io.BytesIO()
-                            image.save(img_bytes, format='PNG')
-                            img_bytes.seek(0)
-                            self.last_result = result
-                            return True, (img_bytes, result)
-                        else:
-                            return False, "未生成图片"
-                    else:
-                        error_text = await response.text()
-                        return False, f"API错误 ({response.status}): {error_text}"
-        except asyncio.TimeoutError:
-            return False, "生成超时，请检查提示词复杂度"
-        except Exception as e:
-            return False, f"生成失败: {str(e)}"
-
-    async def save_last_result_locally(self) -> Optional[str]:
-        """保存图片到本地，使用 SD WebUI 标准格式"""
-        try:
-            api_info = self.last_result.get('info', None)
-            image_data = base64.b64decode(self.last_result['images'][0])
-            image = Image.open(io.BytesIO(image_data))
-            save_dir: str = Config.LOCAL_SAVE_PATH
-            if not os.path.isabs(save_dir):
-                save_dir = os.path.join(Config.DATA_DIR, save_dir)
-            if not os.path.exists(save_dir):
-                os.makedirs(save_dir)
-            timestamp: str = datetime.now().strftime("%Y%m%d_%H%M%S")
-            filename: str = f"{timestamp}.png"
-            filepath: str = os.path.join(save_dir, filename)
-            metadata: PngInfo = PngInfo()
-            if api_info and isinstance(api_info, str) and api_info.strip():
-                try:
-                    parameters_text = json.loads(api_info).get('infotexts', [''])[0]
-                except Exception:
-                    parameters_text = api_info
-                if parameters_text:
-                    metadata.add_text("parameters", parameters_text)
-            image.save(filepath, 'PNG', pnginfo=metadata)
-            print(f"图片已保存: {filepath}")
-            return filepath
-        except Exception as e:
-            print(f"保存图片到本地失败: {e}")
-            return None
-
-    async def save_result_locally(self, result: Dict[str, Any]) -> Optional[str]:
-        """根据传入的 SD 结果保存图片（包含 metadata），避免使用全局 last_result。"""
-        try:
-            api_info = result.get('info', None)
-            if not result.get('images'):
-                return None
-            image_data = base64.b64decode(result['images'][0])
-            image = Image.open(io.BytesIO(image_data))
-            save_dir: str = Config.LOCAL_SAVE_PATH
-            if not os.path.isabs(save_dir):
-                save_dir = os.path.join(Config.DATA_DIR, save_dir)
-            if not os.path.exists(save_dir):
-                os.makedirs(save_dir)
-            timestamp: str = datetime.now().strftime("%Y%m%d_%H%M%S")
-            filename: str = f"{timestamp}.png"
-            filepath: str = os.path.join(save_dir, filename)
-            metadata: PngInfo = PngInfo()
-            if api_info and isinstance(api_info, str) and api_info.strip():
-                try:
-                    parameters_text = json.loads(api_info).get('infotexts', [''])[0]
-                except Exception:
-                    parameters_text = api_info
-                if parameters_text:
-                    metadata.add_text("parameters", parameters_text)
-            image.save(filepath, 'PNG', pnginfo=metadata)
-            print(f"图片已保存: {filepath}")
-            return filepath
-        except Exception as e:
-            print(f"保存图片到本地失败: {e}")
-            return None
-
-    async def interrupt_generation(self) -> bool:
-        """中断当前生成"""
-        try:
-            async with aiohttp.ClientSession() as session:
-                async with session.post(f"{self.api_url}/sdapi/v1/interrupt", timeout=5) as response:
-                    return response.status == 200
-        except Exception:
-            return False
-
-    async def get_progress(self) -> Tuple[float, float]:
-        """获取生成进度"""
-        try:
-            async with aiohttp.ClientSession() as session:
-                async with session.get(f"{self.api_url}/sdapi/v1/progress", timeout=5) as response:
-                    if response.status == 200:
-                        progress = await response.json()
-                        return progress.get('progress', 0), progress.get('eta_relative', 0)
-                    return 0, 0
-        except Exception:
-            return 0, 0
-
-    async def enhance_with_hr(self, original_result: Dict[str, Any]) -> Tuple[bool, Union[Tuple[io.BytesIO, Dict[str, Any]], str]]:
-        """基于已有 txt2img 结果，复用原参数并启用高清修复后再次生成。"""
-        try:
-            info_text = original_result.get('info')
-            if isinstance(info_text, str):
-                try:
-                    infotexts = json.loads(info_text).get('infotexts', [])
-                except Exception:
-                    infotexts = []
-            else:
-                infotexts = []
-            # 无法稳定从 infotexts 解析所有参数，回退仅复用 prompt/negative_prompt，由上层传入 hr 参数
-            # 这里直接返回失败，让上层使用已有 user_settings + hr 覆盖后再次 generate_image
-            return False, "需要上层传入参数以启用高清化"
-        except Exception as e:
-            return False, f"解析原结果失败: {e}"
\ No newline at end of file
+import aiohttp
+import asyncio
+import base64
+import io
+import os
+import random
+import re
+import time
+from typing import Optional, Any, Awaitable, Callable, Dict, List, Tuple, TypeVar, Union
+from PIL import Image
+from config import Config
+from PIL.PngImagePlugin import PngInfo
+import json
+import logging
+
+try:
+    import orjson
+except ImportError:  # orjson 为可选依赖，缺失时回退到标准库 json
+    orjson = None
+
+logger = logging.getLogger(__name__)
+
+_T = TypeVar('_T')
+
+# 幂等 GET 遇到这些网关类状态码时视为瞬时故障，退避后重试
+_RETRY_STATUSES = frozenset({502, 503, 504})
+
+# 模型名：取最后一级路径（兼容 / 与 \），去掉 .safetensors/.ckpt 扩展名
+_MODEL_NAME_RE = re.compile(r'([^\\/]*?)(?:\.safetensors|\.ckpt)?$')
+
+# txt2img 的响应里嵌有数 MB 的 base64，解析/序列化优先使用 orjson
+_json_loads: Callable[[Union[str, bytes]], Any] = orjson.loads if orjson is not None else json.loads
+
+
+def _json_dumps(obj: Any) -> str:
+    if orjson is not None:
+        return orjson.dumps(obj).decode()
+    return json.dumps(obj)
+
+
+class _FetchAbandoned(Exception):
+    """合并请求的发起者被取消，等待者应自行重新获取"""
+
+
+def next_interval(interval: float, stalled: bool) -> float:
+    """进度轮询间隔：进度停滞时翻倍（不超过上限），有变化时回到基础间隔"""
+    if not stalled:
+        return Config.SD_PROGRESS_POLL_INTERVAL
+    return min(interval * 2, Config.SD_PROGRESS_POLL_MAX_INTERVAL)
+
+
+class StableDiffusionController:
+    api_url: str
+    timeout: int
+    last_result: Optional[Dict[str, Any]]
+    _session: Optional[aiohttp.ClientSession]
+    _progress_state: Tuple[float, float]
+    _progress_task: Optional["asyncio.Task[None]"]
+    _progress_users: int
+    _ready_save_dir: Optional[str]
+    _cache: Dict[str, Tuple[float, Any]]
+    _inflight: Dict[str, "asyncio.Future[Any]"]
+    _healthy_at: float
+    _gen_sem: Optional[asyncio.Semaphore]
+
+    def __init__(self) -> None:
+        self.api_url = Config.SD_API_URL
+        self.timeout = Config.SD_API_TIMEOUT
+        self.last_result = None
+        self._session = None
+        # 生成期间由后台任务刷新的最新 (进度, 剩余时间)
+        self._progress_state = (0.0, 0.0)
+        self._progress_task = None
+        self._progress_users = 0
+        # 已确认存在的保存目录
+        self._ready_save_dir = None
+        # 半静态接口的结果缓存：键 -> (获取时间, 值)
+        self._cache = {}
+        # 正在进行中的请求：同一键的并发调用共享一个结果
+        self._inflight = {}
+        # 最近一次健康检查成功的时间
+        self._healthy_at = float('-inf')
+        # 限制并发的 txt2img 请求数，避免压垮 GPU 后端；与会话一同在运行中的事件循环里创建
+        self._gen_sem = None
+
+    async def __aenter__(self) -> "StableDiffusionController":
+        return self
+
+    async def __aexit__(self, *exc_info: Any) -> None:
+        await self.close()
+
+    async def _get_session(self) -> aiohttp.ClientSession:
+        """获取共享会话，首次使用时创建；连接池复用长连接，省去每次请求的握手"""
+        session = self._session
+        if session is None or session.closed:
+            # 只连接同一个 WebUI：连接数按预期并发设置，DNS 结果缓存 5 分钟；
+            # 不需要 Cookie，用 DummyCookieJar 跳过 Cookie 的解析与保存
+            session = aiohttp.ClientSession(
+                connector=aiohttp.TCPConnector(
+                    limit=Config.SD_CONN_LIMIT,
+                    limit_per_host=Config.SD_CONN_LIMIT,
+                    keepalive_timeout=75,
+                    enable_cleanup_closed=True,
+                    ttl_dns_cache=300,
+                ),
+                cookie_jar=aiohttp.DummyCookieJar(),
+                json_serialize=_json_dumps,
+                # 连接阶段单独限时，WebUI 宕机时不必等满整个生成超时
+                timeout=aiohttp.ClientTimeout(total=self.timeout, sock_connect=5, sock_read=self.timeout),
+            )
+            self._session = session
+        if self._gen_sem is None:
+            self._gen_sem = asyncio.Semaphore(max(Config.SD_MAX_CONCURRENT_GEN, 1))
+        return session
+
+    async def close(self) -> None:
+        """停止进度轮询并关闭共享会话"""
+        await self._stop_progress_poller()
+        session = self._session
+        self._session = None
+        self._gen_sem = None
+        if session is not None and not session.closed:
+            await session.close()
+
+    async def check_api_status(self) -> bool:
+        """检查SD WebUI API是否可用；健康结果短时间内复用，失败则每次都重新探测"""
+        if time.monotonic() - self._healthy_at < Config.SD_HEALTH_CACHE_TTL:
+            return True
+        try:
+            session = await self._get_session()
+            # 只关心状态码，用 HEAD 省去 options 的整段 JSON；
+            # FastAPI 路由不接受 HEAD 时返回 405，同样说明服务在线
+            async with session.head(f"{self.api_url}/sdapi/v1/options",
+                                    timeout=aiohttp.ClientTimeout(total=5)) as response:
+                logger.debug("SD API状态检查: %s", response.status)
+                healthy = response.status in (200, 405)
+                if healthy:
+                    self._healthy_at = time.monotonic()
+                return healthy
+        except aiohttp.ClientConnectorError as e:
+            logger.debug("SD API连接错误: %s", e)
+            return False
+        except asyncio.TimeoutError:
+            logger.debug("SD API连接超时")
+            return False
+        except Exception as e:
+            logger.debug("SD API未知错误: %s", e)
+            return False
+
+    async def _cached(self, key: str, ttl: float, fetch: Callable[[], Awaitable[Optional[_T]]]) -> Optional[_T]:
+        """在 ttl 秒内直接返回缓存值；并发的同键请求合并为一次；获取失败（None）不写入缓存"""
+        while True:
+            entry = self._cache.get(key)
+            if entry is not None and time.monotonic() - entry[0] < ttl:
+                return entry[1]
+            pending = self._inflight.get(key)
+            if pending is None:
+                break
+            try:
+                # shield：某个等待者被取消时不会连带取消共享的 future
+                return await asyncio.shield(pending)
+            except _FetchAbandoned:
+                # 发起请求的调用者被取消，由当前调用者重新获取
+                continue
+        fut = asyncio.get_running_loop().create_future()
+        self._inflight[key] = fut
+        try:
+            value = await fetch()
+        except asyncio.CancelledError:
+            # 取消只属于发起者本身，不传给其他等待者，让它们重试
+            self._settle(fut, exception=_FetchAbandoned())
+            raise
+        except Exception as e:
+            self._settle(fut, exception=e)
+            raise
+        else:
+            if value is not None:
+                self._cache[key] = (time.monotonic(), value)
+            self._settle(fut, result=value)
+            return value
+        finally:
+            if self._inflight.get(key) is fut:
+                del self._inflight[key]
+
+    @staticmethod
+    def _settle(fut: "asyncio.Future[Any]", result: Any = None, exception: Optional[BaseException] = None) -> None:
+        """为共享 future 设置结果；已完成时忽略"""
+        if fut.done():
+            return
+        if exception is None:
+            fut.set_result(result)
+            return
+        fut.set_exception(exception)
+        # 无其他等待者时避免 "exception was never retrieved" 警告
+        fut.exception()
+
+    def invalidate(self, key: Optional[str] = None) -> None:
+        """清除指定键的缓存，key 为 None 时全部清除"""
+        if key is None:
+            self._cache.clear()
+        else:
+            self._cache.pop(key, None)
+
+    async def get_models(self) -> List[str]:
+        """获取可用模型列表"""
+        return await self._cached("models", Config.SD_LIST_CACHE_TTL, self._fetch_models) or []
+
+    async def _get_json(self, path: str, timeout: float = 10) -> Optional[Any]:
+        """幂等 GET：连接失败、超时与 502/503/504 按指数退避重试，其余非 200 返回 None；
+        重试用尽后连接类异常照常抛出"""
+        delay = 0.2
+        for attempt in range(1, Config.SD_GET_ATTEMPTS + 1):
+            last_attempt = attempt == Config.SD_GET_ATTEMPTS
+            try:
+                session = await self._get_session()
+                async with session.get(f"{self.api_url}{path}", timeout=timeout) as response:
+                    if response.status == 200:
+                        return await response.json(loads=_json_loads)
+                    if response.status not in _RETRY_STATUSES or last_attempt:
+                        return None
+            except (aiohttp.ClientConnectionError, asyncio.TimeoutError):
+                # 传输失败说明服务可能已下线，不再沿用缓存的健康结果
+                self._healthy_at = float('-inf')
+                if last_attempt:
+                    raise
+            logger.debug("GET %s 失败，%.1f 秒后重试（第 %d 次）", path, delay, attempt)
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, 2.0)
+        return None
+
+    async def _fetch_models(self) -> Optional[List[str]]:
+        try:
+            models = await self._get_json("/sdapi/v1/sd-models")
+            return [model['title'] for model in models] if models is not None else None
+        except Exception:
+            return None
+
+    async def get_current_model(self) -> str:
+        """获取当前使用的模型"""
+        try:
+            options = await self._cached("options", Config.SD_OPTIONS_CACHE_TTL, self._fetch_options)
+        except Exception as e:
+            logger.warning("获取当前模型失败: %s", e)
+            return "未知"
+        if options is None:
+            return "获取失败"
+        return self._model_name(options)
+
+    async def fetch_status_and_model(self) -> Tuple[bool, str]:
+        """一次 options 请求同时得到 API 是否在线与当前模型，省去单独的健康检查"""
+        try:
+            options = await self._cached("options", Config.SD_OPTIONS_CACHE_TTL, self._fetch_options)
+        except Exception as e:
+            logger.debug("SD API状态检查失败: %s", e)
+            return False, "未知"
+        if options is None:
+            return False, "获取失败"
+        self._healthy_at = time.monotonic()
+        return True, self._model_name(options)
+
+    @staticmethod
+    def _model_name(options: Dict[str, Any]) -> str:
+        """从 options 中取出模型名，去掉目录与扩展名"""
+        current_model = options.get('sd_model_checkpoint', '未知')
+        match = _MODEL_NAME_RE.search(current_model)
+        return match.group(1) if match is not None else current_model
+
+    async def _fetch_options(self) -> Optional[Dict[str, Any]]:
+        # 网络异常直接抛出，由调用方区分"获取失败"与"未知"
+        return await self._get_json("/sdapi/v1/options")
+
+    async def get_samplers(self) -> List[str]:
+        """获取可用采样器列表"""
+        return await self._cached("samplers", Config.SD_LIST_CACHE_TTL, self._fetch_samplers) or []
+
+    async def _fetch_samplers(self) -> Optional[List[str]]:
+        try:
+            samplers = await self._get_json("/sdapi/v1/samplers")
+            return [sampler['name'] for sampler in samplers] if samplers is not None else None
+        except Exception:
+            return None
+
+    async def generate_image(
+        self,
+        prompt: str,
+        negative_prompt: Optional[str] = None,
+        **params: Any
+    ) -> Tuple[bool, Union[Tuple[io.BytesIO, Dict[str, Any]], str]]:
+        """生成图片"""
+        generation_params: Dict[str, Any] = Config.SD_DEFAULT_PARAMS.copy()
+        generation_params.update(params)
+        generation_params['prompt'] = prompt
+        if negative_prompt:
+            generation_params['negative_prompt'] = negative_prompt
+
+        # 生成期间只由一个后台任务轮询进度（并发生成共用），调用方读取缓存值
+        self._progress_users += 1
+        if self._progress_task is None or self._progress_task.done():
+            self._progress_task = asyncio.create_task(self._progress_poller())
+        try:
+            session = await self._get_session()
+            gen_sem = self._gen_sem
+            assert gen_sem is not None
+            # 同时提交给 WebUI 的生成请求不超过 SD_MAX_CONCURRENT_GEN，其余在此排队；查询类 GET 不受限
+            async with gen_sem, session.post(
+                f"{self.api_url}/sdapi/v1/txt2img",
+                json=generation_params,
+            ) as response:
+                if response.status == 200:
+                    # 直接取原始字节交给 JSON 解析，省去先转成 str 的一份拷贝；
+                    # 数 MB 的 JSON 解析与 base64 解码一起放到线程中，不阻塞其他用户的协程
+                    body = await response.read()
+                    result, image_data = await asyncio.to_thread(self._parse_txt2img, body)
+                    if image_data is not None:
+                        # API 返回的已是 PNG，解码后直接发送，不经 PIL 解码再重新编码
+                        img_bytes = io.BytesIO(image_data)
+                        # 保留解码后的字节供本地保存复用，丢弃体积更大的 base64 原文
+                        result['image_bytes'] = image_data
+                        result['images'] = None
+                        self.last_result = result
+                        return True, (img_bytes, result)
+                    else:
+                        return False, "未生成图片"
+                else:
+                    error_text = await response.text()
+                    return False, f"API错误 ({response.status}): {error_text}"
+        except asyncio.TimeoutError:
+            self._healthy_at = float('-inf')
+            return False, "生成超时，请检查提示词复杂度"
+        except aiohttp.ClientError as e:
+            self._healthy_at = float('-inf')
+            return False, f"生成失败: {str(e)}"
+        except Exception as e:
+            return False, f"生成失败: {str(e)}"
+        finally:
+            self._progress_users -= 1
+            if self._progress_users == 0:
+                await self._stop_progress_poller()
+
+    def _parse_txt2img(self, body: bytes) -> Tuple[Dict[str, Any], Optional[bytes]]:
+        """解析 txt2img 响应，返回 (结果, 首张图片字节)；没有图片时字节为 None"""
+        result: Dict[str, Any] = _json_loads(body)
+        # info 本身是一段 JSON 字符串，这里顺带解析一次，保存时直接取用
+        result['parameters_text'] = self._parameters_text(result.get('info'))
+        images = result.get('images')
+        return result, (self._decode_image(images[0]) if images else None)
+
+    @staticmethod
+    def _parameters_text(api_info: Any) -> str:
+        """从 info 中取出 WebUI 标准的 parameters 文本；info 不是 JSON 时原样使用"""
+        if not (api_info and isinstance(api_info, str) and api_info.strip()):
+            return ''
+        try:
+            return _json_loads(api_info).get('infotexts', [''])[0]
+        except Exception:
+            return api_info
+
+    @staticmethod
+    def _decode_image(image_b64: str) -> bytes:
+        """解码 API 返回的图片；开启 SD_VALIDATE_PNG 时额外用 PIL 校验数据完整性"""
+        image_data = base64.b64decode(image_b64)
+        if Config.SD_VALIDATE_PNG:
+            Image.open(io.BytesIO(image_data)).verify()
+        return image_data
+
+    async def save_last_result_locally(self) -> Optional[str]:
+        """保存图片到本地，使用 SD WebUI 标准格式"""
+        return await self.save_result_locally(self.last_result)
+
+    async def save_result_locally(self, result: Dict[str, Any]) -> Optional[str]:
+        """根据传入的 SD 结果保存图片（包含 metadata），避免使用全局 last_result。"""
+        try:
+            api_info = result.get('info', None)
+            # generate_image 已解码过的结果直接复用字节与 parameters，否则回退到原始字段
+            image = result.get('image_bytes') or (result.get('images') or [None])[0]
+            if not image:
+                return None
+            # 解码与 PNG 编码都是阻塞操作，放到线程中执行，不阻塞事件循环
+            filepath = await asyncio.to_thread(
+                self._save_sync, image, api_info, result.get('parameters_text')
+            )
+            logger.info("图片已保存: %s", filepath)
+            return filepath
+        except Exception as e:
+            logger.warning("保存图片到本地失败: %s", e)
+            return None
+
+    def _save_sync(self, image: Union[bytes, str], api_info: Any, parameters_text: Optional[str] = None) -> str:
+        """在工作线程中写入 PNG（附带 parameters 元数据），返回文件路径"""
+        image_data = image if isinstance(image, bytes) else base64.b64decode(image)
+        image = Image.open(io.BytesIO(image_data))
+        save_dir: str = Config.LOCAL_SAVE_PATH
+        if not os.path.isabs(save_dir):
+            save_dir = os.path.join(Config.DATA_DIR, save_dir)
+        # 目录只需创建一次，之后的保存跳过检查
+        if save_dir != self._ready_save_dir:
+            os.makedirs(save_dir, exist_ok=True)
+            self._ready_save_dir = save_dir
+        timestamp: str = time.strftime("%Y%m%d_%H%M%S")
+        filename: str = f"{timestamp}.png"
+        filepath: str = os.path.join(save_dir, filename)
+        metadata: PngInfo = PngInfo()
+        if parameters_text is None:
+            parameters_text = self._parameters_text(api_info)
+        if parameters_text:
+            metadata.add_text("parameters", parameters_text)
+        image.save(filepath, 'PNG', pnginfo=metadata)
+        return filepath
+
+    async def interrupt_generation(self) -> bool:
+        """中断当前生成"""
+        try:
+            session = await self._get_session()
+            async with session.post(f"{self.api_url}/sdapi/v1/interrupt", timeout=5) as response:
+                return response.status == 200
+        except Exception:
+            return False
+
+    async def get_progress(self) -> Tuple[float, float]:
+        """获取生成进度；生成期间直接返回后台轮询的结果"""
+        if self._progress_task is not None and not self._progress_task.done():
+            return self._progress_state
+        # 非生成期间的查询在 1 秒内复用上次结果
+        return await self._cached("progress", 1.0, self._fetch_progress) or (0.0, 0.0)
+
+    async def _progress_poller(self) -> None:
+        """刷新进度缓存直到被取消；进度长时间不变时逐步放慢轮询"""
+        interval = Config.SD_PROGRESS_POLL_INTERVAL
+        last_progress = None
+        while True:
+            self._progress_state = await self._fetch_progress()
+            progress = self._progress_state[0]
+            interval = next_interval(interval, progress == last_progress)
+            last_progress = progress
+            # 加入随机抖动，避免多个实例同步请求
+            await asyncio.sleep(interval * random.uniform(0.8, 1.2))
+
+    async def _stop_progress_poller(self) -> None:
+        task = self._progress_task
+        self._progress_task = None
+        self._progress_state = (0.0, 0.0)
+        if task is not None and not task.done():
+            task.cancel()
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
+
+    async def _fetch_progress(self) -> Tuple[float, float]:
+        """请求一次 /sdapi/v1/progress（不要预览图，省去服务端编码与传输）"""
+        try:
+            session = await self._get_session()
+            async with session.get(f"{self.api_url}/sdapi/v1/progress?skip_current_image=true",
+                                   timeout=5) as response:
+                if response.status == 200:
+                    progress = await response.json(loads=_json_loads)
+                    return progress.get('progress', 0), progress.get('eta_relative', 0)
+                return 0, 0
+        except Exception:
+            return 0, 0
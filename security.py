@@ -1,169 +1,213 @@
-# security.py
-import time
-from functools import wraps
-from config import Config
-from typing import Dict, Any, List, Optional, Tuple, TypedDict
-
-class Task(TypedDict):
-    user_id: str
-    prompt: str
-    start_time: float
-    completed: bool
-    end_time: Optional[float]
-    result: Optional[str]
-
-class GenerationRecord(TypedDict):
-    user_id: str
-    username: str
-    prompt: str
-    success: bool
-    error: Optional[str]
-    timestamp: float
-
-class SecurityManager:
-    authorized_users: List[str]
-    generation_history: List[GenerationRecord]
-    tasks: Dict[str, Task]
-
-    def __init__(self) -> None:
-        # 从配置加载授权用户ID（确保为str类型列表）
-        self.authorized_users = getattr(Config, "AUTHORIZED_USERS", [])
-        self.generation_history = []
-        self.tasks = {}
-        self.rate_limits: Dict[str, List[float]] = {}
-        self.active_tasks: Dict[str, Task] = {}  # 跟踪活跃任务
-    
-    def is_authorized_user(self, user_id: str) -> bool:
-        """检查用户是否被授权"""
-        return user_id in self.authorized_users
-    
-    def is_safe_prompt(self, prompt: str) -> Tuple[bool, str]:
-        """检查提示词是否安全"""
-        prompt_lower = prompt.lower()
-        
-        # 检查提示词长度
-        if len(prompt) > Config.MAX_PROMPT_LENGTH:
-            return False, "提示词过长"
-        
-        # 检查是否包含不当内容
-        unsafe_keywords = [
-            'violence', 'gore', 'blood', 'kill', 'death'
-        ]
-        
-        for keyword in unsafe_keywords:
-            if keyword in prompt_lower:
-                return False, f"包含不当内容: {keyword}"
-        
-        return True, "安全"
-    
-    def check_generation_limit(self, user_id: str, limit: int = 3, window: int = 300) -> Tuple[bool, str]:
-        return True, "通过"
-        # """检查用户生图频率限制 (5分钟内最多3张)"""
-        # now = time.time()
-        # if user_id not in self.rate_limits:
-        #     self.rate_limits[user_id] = []
-        
-        # # 清理过期记录
-        # self.rate_limits[user_id] = [
-        #     timestamp for timestamp in self.rate_limits[user_id]
-        #     if now - timestamp < window
-        # ]
-        
-        # if len(self.rate_limits[user_id]) >= limit:
-        #     return False, f"生图频率过高，请等待{window//60}分钟"
-        
-        # return True, "通过"
-    
-    def add_generation_record(self, user_id: str) -> None:
-        """添加生图记录"""
-        now = time.time()
-        if user_id not in self.rate_limits:
-            self.rate_limits[user_id] = []
-        self.rate_limits[user_id].append(now)
-    
-    def get_queue_size(self) -> int:
-        """获取当前队列大小"""
-        return len([task for task in self.active_tasks.values() if not task.get('completed', False)])
-    
-    def add_task(self, task_id: str, user_id: str, prompt: str) -> None:
-        """添加任务到队列"""
-        task: Task = {
-            'user_id': user_id,
-            'prompt': prompt,
-            'start_time': time.time(),
-            'completed': False,
-            'end_time': None,
-            'result': None,
-        }
-        self.active_tasks[task_id] = task
-    
-    def complete_task(self, task_id: str, status: str) -> None:
-        """标记任务完成"""
-        if task_id in self.active_tasks:
-            self.active_tasks[task_id]['completed'] = True
-            self.active_tasks[task_id]['end_time'] = time.time()
-            self.active_tasks[task_id]['result'] = status
-    
-    def log_generation(self, user_id: str, username: str, prompt: str, success: bool, error: Optional[str] = None) -> GenerationRecord:
-        """记录生图日志"""
-        log_entry: GenerationRecord = {
-            'timestamp': time.time(),
-            'user_id': user_id,
-            'username': username,
-            'prompt': prompt[:100] + '...' if len(prompt) > 100 else prompt,
-            'success': success,
-            'error': error or None
-        }
-        self.generation_history.append(log_entry)
-        
-        # 保持最近50条记录
-        if len(self.generation_history) > 50:
-            self.generation_history = self.generation_history[-50:]
-        return log_entry
-
-from typing import Callable, TypeVar, ParamSpec, Coroutine
-
-P = ParamSpec("P")
-R = TypeVar("R")
-
-def require_auth(func: Callable[P, Coroutine[Any, Any, None]]) -> Callable[P, Coroutine[Any, Any, None]]:
-    """认证装饰器（保持原函数签名，兼容 pyright/ptb 泛型）"""
-    @wraps(func)
-    async def wrapper(*args: P.args, **kwargs: P.kwargs) -> None:
-        # 约定 methods: (self, update, context, ...)
-        if not args:
-            # 无 self/参数，直接调用
-            await func(*args, **kwargs)
-            return
-        self_obj = args[0]
-        update: Any = args[1] if len(args) > 1 else None
-        # 上下文对象保留向后兼容，但不强制依赖
-        # context = args[2] if len(args) > 2 else kwargs.get("context")
-
-        user_id: Optional[str] = None
-        try:
-            if update is not None and getattr(update, "effective_user", None) is not None:
-                user_id = str(update.effective_user.id)
-        except Exception:
-            user_id = None
-
-        # 通过实例属性访问 security
-        is_authed = True
-        try:
-            is_authed = bool(getattr(self_obj, "security").is_authorized_user(user_id or ""))
-        except Exception:
-            is_authed = True
-
-        if not is_authed:
-            try:
-                if update is not None and getattr(update, "callback_query", None):
-                    await update.callback_query.answer("❌ 未授权访问", show_alert=True)
-                elif update is not None and getattr(update, "message", None):
-                    await update.message.reply_text("❌ 未授权访问")
-            except Exception:
-                pass
-            return
-
-        await func(*args, **kwargs)
-
+# security.py
+import re
+import sys
+import time
+from collections import deque
+from dataclasses import dataclass, field
+from functools import wraps
+from config import Config
+from typing import Deque, Dict, Any, FrozenSet, Optional, Tuple, TypedDict
+
+# 不当内容关键词预编译为一个忽略大小写的正则，一次扫描完成，无需先 lower() 复制整段提示词
+_UNSAFE_KEYWORDS_RE = re.compile(
+    "|".join(map(re.escape, ('violence', 'gore', 'blood', 'kill', 'death'))),
+    re.IGNORECASE,
+)
+
+class Task(TypedDict):
+    user_id: int
+    prompt: str
+    start_time: float
+    completed: bool
+    end_time: Optional[float]
+    result: Optional[str]
+
+class GenerationRecord(TypedDict):
+    user_id: int
+    username: str
+    prompt: str
+    success: bool
+    error: Optional[str]
+    timestamp: float
+
+# 生图历史只保留最近这么多条
+_HISTORY_LIMIT = 50
+
+def _history_column() -> Deque[Any]:
+    return deque(maxlen=_HISTORY_LIMIT)
+
+@dataclass
+class GenerationHistory:
+    """生图历史（按列存储的并行数组，每条记录不再单独占一个 dict；超出上限时最旧的记录自动淘汰）"""
+    timestamps: Deque[float] = field(default_factory=_history_column)
+    user_ids: Deque[int] = field(default_factory=_history_column)
+    usernames: Deque[str] = field(default_factory=_history_column)
+    prompts: Deque[str] = field(default_factory=_history_column)
+    successes: Deque[bool] = field(default_factory=_history_column)
+    errors: Deque[Optional[str]] = field(default_factory=_history_column)
+
+    def append(self, record: GenerationRecord) -> None:
+        self.timestamps.append(record['timestamp'])
+        self.user_ids.append(record['user_id'])
+        # 用户名重复率高，驻留后各条记录共享同一字符串对象
+        self.usernames.append(sys.intern(record['username']))
+        self.prompts.append(record['prompt'])
+        self.successes.append(record['success'])
+        self.errors.append(record['error'])
+
+    def __len__(self) -> int:
+        return len(self.timestamps)
+
+    def __getitem__(self, index: int) -> GenerationRecord:
+        """按下标还原为单条记录（兼容原先的 list[dict] 访问方式）"""
+        return {
+            'timestamp': self.timestamps[index],
+            'user_id': self.user_ids[index],
+            'username': self.usernames[index],
+            'prompt': self.prompts[index],
+            'success': self.successes[index],
+            'error': self.errors[index],
+        }
+
+class SecurityManager:
+    authorized_users: FrozenSet[int]
+    generation_history: GenerationHistory
+    tasks: Dict[str, Task]
+
+    def __init__(self) -> None:
+        # 从配置加载授权用户ID（int 集合）
+        self.authorized_users = frozenset(getattr(Config, "AUTHORIZED_USERS", ()))
+        self.generation_history = GenerationHistory()
+        self.tasks = {}
+        self.rate_limits: Dict[int, Deque[float]] = {}
+        self.active_tasks: Dict[str, Task] = {}  # 跟踪活跃任务
+    
+    def reset(self) -> None:
+        """清空运行期状态（历史、频率记录、任务），授权用户保持不变"""
+        self.generation_history = GenerationHistory()
+        self.tasks.clear()
+        self.rate_limits.clear()
+        self.active_tasks.clear()
+    
+    def is_authorized_user(self, user_id: int) -> bool:
+        """检查用户是否被授权"""
+        return user_id in self.authorized_users
+    
+    def is_safe_prompt(self, prompt: str) -> Tuple[bool, str]:
+        """检查提示词是否安全"""
+        # 检查提示词长度
+        if len(prompt) > Config.MAX_PROMPT_LENGTH:
+            return False, "提示词过长"
+        
+        # 检查是否包含不当内容
+        match = _UNSAFE_KEYWORDS_RE.search(prompt)
+        if match is not None:
+            return False, f"包含不当内容: {match.group().lower()}"
+        
+        return True, "安全"
+    
+    def check_generation_limit(self, user_id: int, limit: int = 3, window: int = 300) -> Tuple[bool, str]:
+        return True, "通过"
+        # """检查用户生图频率限制 (5分钟内最多3张)"""
+        # if len(self._recent_generations(user_id, window)) >= limit:
+        #     return False, f"生图频率过高，请等待{window//60}分钟"
+        
+        # return True, "通过"
+    
+    def _recent_generations(self, user_id: int, window: int = 300) -> Deque[float]:
+        """返回用户在 window 秒内的生图时间戳；过期记录从队首弹出，无需重建列表"""
+        timestamps = self.rate_limits.get(user_id)
+        if timestamps is None:
+            timestamps = self.rate_limits[user_id] = deque()
+        cutoff = time.time() - window
+        while timestamps and timestamps[0] <= cutoff:
+            timestamps.popleft()
+        return timestamps
+    
+    def add_generation_record(self, user_id: int) -> None:
+        """添加生图记录"""
+        # 追加前顺带清理过期记录，避免频率限制关闭时时间戳无限增长
+        self._recent_generations(user_id).append(time.time())
+    
+    def get_queue_size(self) -> int:
+        """获取当前队列大小"""
+        return len([task for task in self.active_tasks.values() if not task.get('completed', False)])
+    
+    def add_task(self, task_id: str, user_id: int, prompt: str) -> None:
+        """添加任务到队列"""
+        task: Task = {
+            'user_id': user_id,
+            'prompt': prompt,
+            'start_time': time.time(),
+            'completed': False,
+            'end_time': None,
+            'result': None,
+        }
+        self.active_tasks[task_id] = task
+    
+    def complete_task(self, task_id: str, status: str) -> None:
+        """标记任务完成"""
+        if task_id in self.active_tasks:
+            self.active_tasks[task_id]['completed'] = True
+            self.active_tasks[task_id]['end_time'] = time.time()
+            self.active_tasks[task_id]['result'] = status
+    
+    def log_generation(self, user_id: int, username: str, prompt: str, success: bool, error: Optional[str] = None) -> GenerationRecord:
+        """记录生图日志"""
+        log_entry: GenerationRecord = {
+            'timestamp': time.time(),
+            'user_id': user_id,
+            'username': username,
+            'prompt': prompt if len(prompt) <= 100 else f"{prompt[:100]}...",
+            'success': success,
+            'error': error or None
+        }
+        self.generation_history.append(log_entry)
+        return log_entry
+
+from typing import Callable, TypeVar, ParamSpec, Coroutine
+
+P = ParamSpec("P")
+R = TypeVar("R")
+
+def require_auth(func: Callable[P, Coroutine[Any, Any, None]]) -> Callable[P, Coroutine[Any, Any, None]]:
+    """认证装饰器（保持原函数签名，兼容 pyright/ptb 泛型）"""
+    @wraps(func)
+    async def wrapper(*args: P.args, **kwargs: P.kwargs) -> None:
+        # 约定 methods: (self, update, context, ...)
+        if not args:
+            # 无 self/参数，直接调用
+            await func(*args, **kwargs)
+            return
+        self_obj = args[0]
+        update: Any = args[1] if len(args) > 1 else None
+        # 上下文对象保留向后兼容，但不强制依赖
+        # context = args[2] if len(args) > 2 else kwargs.get("context")
+
+        user_id: Optional[int] = None
+        try:
+            if update is not None and getattr(update, "effective_user", None) is not None:
+                user_id = update.effective_user.id
+        except Exception:
+            user_id = None
+
+        # 通过实例属性访问 security
+        is_authed = True
+        try:
+            is_authed = bool(getattr(self_obj, "security").is_authorized_user(user_id if user_id is not None else 0))
+        except Exception:
+            is_authed = True
+
+        if not is_authed:
+            try:
+                if update is not None and getattr(update, "callback_query", None):
+                    await update.callback_query.answer("❌ 未授权访问", show_alert=True)
+                elif update is not None and getattr(update, "message", None):
+                    await update.message.reply_text("❌ 未授权访问")
+            except Exception:
+                pass
+            return
+
+        await func(*args, **kwargs)
+
     return wrapper
\ No newline at end of file